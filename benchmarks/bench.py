@@ -0,0 +1,333 @@
+import argparse
+import gc
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from functools import partial
+from operator import attrgetter
+from statistics import median
+import simplejson as json
+from typing import Any, Callable, Dict, List, Optional
+from google.protobuf import json_format
+from google.protobuf.descriptor import Descriptor
+from google.protobuf.internal import api_implementation
+from google.protobuf.message import Message
+
+from protobuf2arr import instrument
+from protobuf2arr.backends import BACKENDS
+from protobuf2arr.lazy import LazyArrView
+from protobuf2arr.patch import patch_arr
+from protobuf2arr.plan import decode_plan, encode_plan
+from protobuf2arr.subtree import SubtreeCache
+from protobuf2arr.wire import arr_to_binary, binary_to_arr
+from protobuf2arr.serializer import (
+    arr_to_msg,
+    deserialize_arr2msg,
+    deserialize_arr2msg_bytes,
+    msg_to_arr,
+    serialize_msg2arr,
+    serialize_msg2arr_bytes,
+)
+
+from .schemas import SCHEMAS
+
+
+# fields numbered above this go into the trailing object of compact payloads
+PIVOT = 512
+# timing batches per min_time
+BATCHES = 10
+
+# (schema or None for all of them, operation, baseline operation, minimum speed
+# ratio) checked whenever both operations are measured
+EXPECTATIONS = [
+    ("duplicated", "msg_to_arr[subtree_cache]", "msg_to_arr", 1.0),
+    # disabled instrumentation has to stay near free
+    (None, "msg_to_arr", "plan.encode", 0.95),
+    (None, "arr_to_msg", "plan.decode", 0.95),
+]
+
+
+class Case:
+    def __init__(self, cls: type, msg: Message) -> None:
+        self.cls = cls
+        self.msg = msg
+        self.arr = msg_to_arr(msg)
+        self.arr_str = serialize_msg2arr(msg)
+        self.arr_bytes = self.arr_str.encode("UTF-8")
+        self.compact_str = serialize_msg2arr(msg, pivot=PIVOT)
+        self.first_field = cls.DESCRIPTOR.fields[0].name
+        self.first_value = getattr(msg, self.first_field)
+        self.json_str = json_format.MessageToJson(msg)
+        self.binary = msg.SerializeToString()
+        # refilled by the [reuse] operations
+        self.pooled = cls()
+        # sub-messages with a digest field, keyed by it in the [subtree_cache]
+        # operations
+        self.digested = [
+            descriptor
+            for descriptor in _message_types(cls.DESCRIPTOR)
+            if "digest" in descriptor.fields_by_name
+        ]
+
+    def cache(self) -> SubtreeCache:
+        return SubtreeCache(attrgetter("digest"), messages=self.digested)
+
+
+def _message_types(descriptor: Descriptor) -> List[Descriptor]:
+    found = [descriptor]
+    for message_type in found:
+        for field in message_type.fields:
+            sub = field.message_type
+            if sub is not None and sub not in found:
+                found.append(sub)
+    return found
+
+
+OPERATIONS: Dict[str, Callable[[Case], Any]] = {
+    "serialize_msg2arr": lambda case: serialize_msg2arr(case.msg),
+    "deserialize_arr2msg": lambda case: deserialize_arr2msg(case.arr_str, case.cls()),
+    "msg_to_arr": lambda case: msg_to_arr(case.msg),
+    "arr_to_msg": lambda case: arr_to_msg(case.arr, case.cls()),
+    # plans without the msg_to_arr/arr_to_msg wrappers, the difference is the
+    # cost of disabled instrumentation
+    "plan.encode": lambda case: encode_plan(case.cls.DESCRIPTOR).encode(case.msg),
+    "plan.decode": lambda case: decode_plan(case.cls.DESCRIPTOR).decode(
+        case.arr, case.cls()
+    ),
+    "arr_to_msg[reuse]": lambda case: arr_to_msg(case.arr, case.pooled, reuse=True),
+    "deserialize_arr2msg[reuse]": lambda case: deserialize_arr2msg(
+        case.arr_str, case.pooled, reuse=True
+    ),
+    # a cache per call, so only repeats within the payload hit
+    "msg_to_arr[subtree_cache]": lambda case: msg_to_arr(case.msg, cache=case.cache()),
+    "serialize_msg2arr[subtree_cache]": lambda case: serialize_msg2arr(
+        case.msg, cache=case.cache()
+    ),
+    "serialize_msg2arr[compact]": lambda case: serialize_msg2arr(case.msg, pivot=PIVOT),
+    "deserialize_arr2msg[compact]": lambda case: deserialize_arr2msg(
+        case.compact_str, case.cls(), compact=True
+    ),
+    "LazyArrView:first_field": lambda case: getattr(
+        LazyArrView(case.arr, case.cls), case.first_field
+    ),
+    # rewrites the same value, so the shared array stays unchanged
+    "patch_arr:first_field": lambda case: patch_arr(
+        case.arr, case.cls, {case.first_field: case.first_value}
+    ),
+    "binary_to_arr": lambda case: binary_to_arr(case.binary, case.cls.DESCRIPTOR),
+    "arr_to_binary": lambda case: arr_to_binary(case.arr, case.cls.DESCRIPTOR),
+    "baseline:FromString+msg_to_arr": lambda case: msg_to_arr(
+        case.cls.FromString(case.binary)
+    ),
+    "baseline:arr_to_msg+SerializeToString": lambda case: arr_to_msg(
+        case.arr, case.cls()
+    ).SerializeToString(),
+    "baseline:arr_to_msg+msg_to_arr": lambda case: msg_to_arr(
+        arr_to_msg(case.arr, case.cls())
+    ),
+    "baseline:MessageToJson": lambda case: json_format.MessageToJson(case.msg),
+    "baseline:json_format.Parse": lambda case: json_format.Parse(
+        case.json_str, case.cls()
+    ),
+    "baseline:SerializeToString": lambda case: case.msg.SerializeToString(),
+    "baseline:FromString": lambda case: case.cls.FromString(case.binary),
+}
+
+
+def _instrumented(fn: Callable[[Case], Any]) -> Callable[[Case], Any]:
+    def run(case: Case) -> Any:
+        instrument.enable()
+        try:
+            return fn(case)
+        finally:
+            instrument.disable()
+
+    return run
+
+
+for _op in ("serialize_msg2arr", "deserialize_arr2msg", "msg_to_arr", "arr_to_msg"):
+    OPERATIONS[f"{_op}[instrumented]"] = _instrumented(OPERATIONS[_op])
+
+
+def _backend_operations(name: str) -> Dict[str, Callable[[Case], Any]]:
+    return {
+        f"serialize_msg2arr[{name}]": lambda case: serialize_msg2arr(
+            case.msg, backend=name
+        ),
+        f"serialize_msg2arr_bytes[{name}]": lambda case: serialize_msg2arr_bytes(
+            case.msg, backend=name
+        ),
+        f"deserialize_arr2msg_bytes[{name}]": lambda case: deserialize_arr2msg_bytes(
+            case.arr_bytes, case.cls(), backend=name
+        ),
+    }
+
+
+for _name in BACKENDS:
+    OPERATIONS.update(_backend_operations(_name))
+
+
+def measure(
+    fns: Dict[str, Callable[[], Any]], min_time: float, repeat: int = 5
+) -> Dict[str, Dict[str, Any]]:
+    # each operation is timed in many short batches that alternate between the
+    # operations and the median batch counts, so slow phases and clock jumps
+    # of a shared machine hit all of them alike and their ratios stay
+    # comparable
+    slice_time = min_time / BATCHES
+    numbers = {name: _batch_size(fn, slice_time) for name, fn in fns.items()}
+    rates: Dict[str, List[float]] = {name: [] for name in fns}
+    # shuffled per round, an operation running right after another one would
+    # otherwise start on the caches that one left behind every time
+    order, shuffle = list(fns), random.Random(0).shuffle
+    for _ in range(repeat * BATCHES):
+        shuffle(order)
+        for name in order:
+            rates[name].append(_ops_per_sec(fns[name], numbers[name]))
+    return {name: _memory(fn, median(rates[name])) for name, fn in fns.items()}
+
+
+def _ops_per_sec(fn: Callable[[], Any], number: int) -> float:
+    # without collector pauses, like timeit, the garbage of earlier batches is
+    # collected beforehand, it is all in the youngest generation
+    gc.collect(0)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return number / (time.perf_counter() - start)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _batch_size(fn: Callable[[], Any], slice_time: float) -> int:
+    fn()  # warm up plans and caches
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= slice_time:
+            return number
+        number *= 2
+
+
+def _memory(fn: Callable[[], Any], ops_per_sec: float) -> Dict[str, Any]:
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = {
+        "ops_per_sec": ops_per_sec,
+        "peak_bytes": peak,
+        "retained_bytes": current,
+        # blocks still allocated afterwards, freed temporaries are not counted
+        "net_blocks": sys.getallocatedblocks() - blocks,
+    }
+    if isinstance(result, (str, bytes)):
+        stats["payload_bytes"] = len(result)
+    return stats
+
+
+def run(
+    schemas: List[str],
+    operations: List[str],
+    min_time: float,
+    log: Callable[[str], None] = lambda line: None,
+) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for schema in schemas:
+        case = Case(*SCHEMAS[schema]())
+        fns = {op: partial(OPERATIONS[op], case) for op in operations}
+        results[schema] = measure(fns, min_time)
+        for op, stats in results[schema].items():
+            log(
+                f"{schema:<18} {op:<38} {stats['ops_per_sec']:>12.1f} ops/s "
+                f"{stats['peak_bytes']:>12} peak B"
+            )
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "protobuf_implementation": api_implementation.Type(),
+            "min_time": min_time,
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    regressions = 0
+    for schema, ops in current["results"].items():
+        for op, stats in ops.items():
+            old = baseline["results"].get(schema, {}).get(op)
+            if old is None:
+                continue
+            ratio = stats["ops_per_sec"] / old["ops_per_sec"]
+            mem = stats["peak_bytes"] / max(old["peak_bytes"], 1)
+            flag = ""
+            if ratio < 1 - threshold or mem > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{schema:<18} {op:<38} speed x{ratio:.2f} peak x{mem:.2f}{flag}")
+    return regressions
+
+
+def check(current: Dict[str, Any]) -> int:
+    failures = 0
+    for schema, ops in current["results"].items():
+        for expected_schema, op, baseline_op, minimum in EXPECTATIONS:
+            if expected_schema not in (None, schema):
+                continue
+            if op not in ops or baseline_op not in ops:
+                continue
+            ratio = ops[op]["ops_per_sec"] / ops[baseline_op]["ops_per_sec"]
+            if ratio < minimum:
+                failures += 1
+                print(f"{schema:<18} {op:<38} x{ratio:.2f} of {baseline_op}  SLOWER")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench",
+        description="Benchmark protobuf2arr against json_format and binary baselines.",
+    )
+    parser.add_argument("--schemas", nargs="+", default=list(SCHEMAS), choices=SCHEMAS)
+    parser.add_argument(
+        "--ops", nargs="+", default=list(OPERATIONS), choices=OPERATIONS
+    )
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown or peak memory growth reported as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.schemas, args.ops, args.min_time, log=print)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+    failures = check(results)
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        failures += compare(results, baseline, args.threshold)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
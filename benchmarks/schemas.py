@@ -0,0 +1,220 @@
+import random
+from typing import Callable, Dict, Tuple, Type
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from google.protobuf.message import Message
+
+
+PACKAGE = "protobuf2arr_bench"
+NULLABLE_NUMBER = 50999
+
+F = descriptor_pb2.FieldDescriptorProto
+
+_pool = descriptor_pool.Default()
+_factory = message_factory.MessageFactory(_pool)
+_nullable = None
+_built: Dict[str, Dict[str, Type[Message]]] = {}
+
+
+def _nullable_extension():
+    # benchmark schemas declare their own `nullable` option, the serializer only
+    # matches the option name
+    global _nullable
+    if _nullable is None:
+        file_proto = descriptor_pb2.FileDescriptorProto(
+            name=f"{PACKAGE}/options.proto",
+            package=PACKAGE,
+            dependency=["google/protobuf/descriptor.proto"],
+            syntax="proto3",
+        )
+        file_proto.extension.add(
+            name="nullable",
+            number=NULLABLE_NUMBER,
+            type=F.TYPE_STRING,
+            label=F.LABEL_OPTIONAL,
+            extendee=".google.protobuf.FieldOptions",
+        )
+        file_desc = _pool.AddSerializedFile(file_proto.SerializeToString())
+        _nullable = file_desc.extensions_by_name["nullable"]
+        descriptor_pb2.FieldOptions.RegisterExtension(_nullable)
+    return _nullable
+
+
+def _field(message, name, number, type_, label=F.LABEL_OPTIONAL, nullable=None, **kw):
+    field = message.field.add(name=name, number=number, type=type_, label=label, **kw)
+    if nullable is not None:
+        field.options.Extensions[_nullable_extension()] = nullable
+    return field
+
+
+def _build(name: str, define: Callable) -> Dict[str, Type[Message]]:
+    if name in _built:
+        return _built[name]
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=f"{PACKAGE}/{name}.proto",
+        package=f"{PACKAGE}.{name}",
+        dependency=[f"{PACKAGE}/options.proto"],
+        syntax="proto3",
+    )
+    _nullable_extension()
+    define(file_proto)
+    file_desc = _pool.AddSerializedFile(file_proto.SerializeToString())
+    _built[name] = {
+        msg_name: _factory.GetPrototype(desc)
+        for msg_name, desc in file_desc.message_types_by_name.items()
+    }
+    return _built[name]
+
+
+def wide(fields: int = 300) -> Tuple[Type[Message], Message]:
+    types = [
+        (F.TYPE_INT32, "0", lambda r: r.randint(-1000, 1000)),
+        (F.TYPE_INT64, "0", lambda r: r.randint(0, 2**40)),
+        (F.TYPE_DOUBLE, "0.0", lambda r: r.random()),
+        (F.TYPE_STRING, "", lambda r: f"value-{r.randint(0, 9999)}"),
+        (F.TYPE_BOOL, "False", lambda r: r.random() < 0.5),
+        (F.TYPE_BYTES, "", lambda r: b"bytes"),
+    ]
+
+    def define(file_proto):
+        message = file_proto.message_type.add(name="Wide")
+        for i in range(fields):
+            type_, default, _ = types[i % len(types)]
+            nullable = default if i % 2 else None
+            _field(message, f"field_{i}", i + 1, type_, nullable=nullable)
+
+    cls = _build("wide", define)["Wide"]
+    r = random.Random(fields)
+    msg = cls()
+    for i in range(fields):
+        if r.random() < 0.7:
+            setattr(msg, f"field_{i}", types[i % len(types)][2](r))
+    return cls, msg
+
+
+def deep(depth: int = 50) -> Tuple[Type[Message], Message]:
+    def define(file_proto):
+        message = file_proto.message_type.add(name="Node")
+        _field(message, "value", 1, F.TYPE_INT32, nullable="0")
+        _field(message, "name", 2, F.TYPE_STRING)
+        node_type = f".{PACKAGE}.deep.Node"
+        _field(message, "child", 3, F.TYPE_MESSAGE, type_name=node_type, nullable="")
+
+    cls = _build("deep", define)["Node"]
+    msg = cls()
+    node = msg
+    for i in range(depth):
+        node.value = i
+        node.name = f"node-{i}"
+        node = node.child
+    return cls, msg
+
+
+def repeated_scalars(count: int = 100_000) -> Tuple[Type[Message], Message]:
+    def define(file_proto):
+        message = file_proto.message_type.add(name="Scalars")
+        _field(message, "ints", 1, F.TYPE_INT64, F.LABEL_REPEATED)
+        _field(message, "doubles", 2, F.TYPE_DOUBLE, F.LABEL_REPEATED)
+        _field(message, "strings", 3, F.TYPE_STRING, F.LABEL_REPEATED, nullable="[]")
+
+    cls = _build("scalars", define)["Scalars"]
+    r = random.Random(count)
+    msg = cls()
+    msg.ints.extend(r.randint(0, 2**40) for _ in range(count))
+    msg.doubles.extend(r.random() for _ in range(count))
+    msg.strings.extend(f"s{i}" for i in range(count // 10))
+    return cls, msg
+
+
+def repeated_messages(count: int = 10_000) -> Tuple[Type[Message], Message]:
+    def define(file_proto):
+        item = file_proto.message_type.add(name="Item")
+        _field(item, "id", 1, F.TYPE_INT32, nullable="0")
+        _field(item, "name", 2, F.TYPE_STRING, nullable="")
+        _field(item, "score", 3, F.TYPE_DOUBLE)
+        _field(item, "tags", 5, F.TYPE_STRING, F.LABEL_REPEATED)
+        message = file_proto.message_type.add(name="Items")
+        _field(message, "total", 1, F.TYPE_INT32)
+        item_type = f".{PACKAGE}.messages.Item"
+        _field(
+            message,
+            "items",
+            2,
+            F.TYPE_MESSAGE,
+            F.LABEL_REPEATED,
+            type_name=item_type,
+            nullable="",
+        )
+
+    cls = _build("messages", define)["Items"]
+    r = random.Random(count)
+    msg = cls(total=count)
+    for i in range(count):
+        item = msg.items.add()
+        if i % 3:  # every third item is empty and encodes as null
+            item.id = i
+            item.name = f"item-{i}"
+            item.score = r.random()
+            item.tags.extend(["a", "b"])
+    return cls, msg
+
+
+def sparse(
+    numbers: Tuple[int, ...] = (1, 2, 1000, 5000)
+) -> Tuple[Type[Message], Message]:
+    def define(file_proto):
+        message = file_proto.message_type.add(name="Sparse")
+        for number in numbers:
+            _field(message, f"field_{number}", number, F.TYPE_STRING, nullable="")
+
+    cls = _build("sparse", define)["Sparse"]
+    msg = cls()
+    for number in numbers:
+        setattr(msg, f"field_{number}", f"value-{number}")
+    return cls, msg
+
+
+def duplicated(count: int = 5_000, headers: int = 4) -> Tuple[Type[Message], Message]:
+    def define(file_proto):
+        header = file_proto.message_type.add(name="Header")
+        _field(header, "locale", 1, F.TYPE_STRING, nullable="")
+        _field(header, "region", 2, F.TYPE_STRING)
+        _field(header, "flags", 3, F.TYPE_STRING, F.LABEL_REPEATED)
+        _field(header, "version", 4, F.TYPE_INT32, nullable="0")
+        # content hash set by the producer, the sub-tree cache key
+        _field(header, "digest", 5, F.TYPE_STRING)
+        entry = file_proto.message_type.add(name="Entry")
+        _field(entry, "id", 1, F.TYPE_INT32)
+        header_type = f".{PACKAGE}.duplicated.Header"
+        _field(entry, "header", 2, F.TYPE_MESSAGE, type_name=header_type)
+        message = file_proto.message_type.add(name="Feed")
+        entry_type = f".{PACKAGE}.duplicated.Entry"
+        _field(
+            message,
+            "entries",
+            1,
+            F.TYPE_MESSAGE,
+            F.LABEL_REPEATED,
+            type_name=entry_type,
+        )
+
+    cls = _build("duplicated", define)["Feed"]
+    msg = cls()
+    for i in range(count):
+        # few distinct headers repeated across all entries
+        entry = msg.entries.add(id=i)
+        entry.header.locale = f"locale-{i % headers}"
+        entry.header.region = "eu-west"
+        entry.header.flags.extend(["beta", "dark-mode", f"cohort-{i % headers}"])
+        entry.header.version = 3
+        entry.header.digest = f"header-{i % headers}"
+    return cls, msg
+
+
+SCHEMAS: Dict[str, Callable[[], Tuple[Type[Message], Message]]] = {
+    "wide": wide,
+    "deep": deep,
+    "repeated_scalars": repeated_scalars,
+    "repeated_messages": repeated_messages,
+    "sparse": sparse,
+    "duplicated": duplicated,
+}
@@ -1 +1,16 @@
-from .serializer import serialize_msg2arr, deserialize_arr2msg
+from .serializer import (
+    serialize_msg2arr,
+    deserialize_arr2msg,
+    deserialize_arr2msg_from,
+    iter_serialize_msg2arr,
+    serialize_msg2arr_to,
+    serialize_msg2arr_bytes,
+    deserialize_arr2msg_bytes,
+)
+from .backends import set_backend
+from .plan import precompile
+from .subtree import SubtreeCache
+from .lazy import LazyArrView
+from .patch import patch_arr
+from .wire import binary_to_arr, arr_to_binary
+from .batch import serialize_many, deserialize_many
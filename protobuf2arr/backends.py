@@ -0,0 +1,137 @@
+import json as _stdlib_json
+import re
+import simplejson
+from typing import Any, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # optional, pip install orjson
+    orjson = None
+
+
+SEPARATORS = (",", ":")
+# simplejson writes NaN and Infinity up to 3.18 and rejects them from 3.19 on,
+# every backend follows the installed version
+ALLOW_NAN = simplejson.JSONEncoder().allow_nan
+
+
+class JsonBackend:
+    name = ""
+
+    def dumps(self, arr: Any) -> str:
+        raise NotImplementedError
+
+    def dumps_bytes(self, arr: Any) -> bytes:
+        return self.dumps(arr).encode("UTF-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        raise NotImplementedError
+
+
+class SimplejsonBackend(JsonBackend):
+    name = "simplejson"
+
+    def dumps(self, arr: Any) -> str:
+        return simplejson.dumps(arr, separators=SEPARATORS, allow_nan=ALLOW_NAN)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return simplejson.loads(data)
+
+
+class StdlibBackend(JsonBackend):
+    name = "json"
+
+    def dumps(self, arr: Any) -> str:
+        return _stdlib_json.dumps(
+            arr, separators=SEPARATORS, default=_default, allow_nan=ALLOW_NAN
+        )
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return _stdlib_json.loads(data)
+
+
+class OrjsonBackend(JsonBackend):
+    # orjson writes non-ASCII characters and \x7f unescaped, which is fixed up
+    # afterwards, and spells floats outside [1e-4, 1e16) differently (1e16 for
+    # 1e+16, 0.00001 for 1e-05, NaN/Infinity as null), such arrays are left to
+    # simplejson
+    name = "orjson"
+
+    def dumps(self, arr: Any) -> str:
+        return self.dumps_bytes(arr).decode("ascii")
+
+    def dumps_bytes(self, arr: Any) -> bytes:
+        if not _plain_floats(arr):
+            return simplejson.dumps(
+                arr, separators=SEPARATORS, allow_nan=ALLOW_NAN
+            ).encode("ascii")
+        data = orjson.dumps(arr, default=_default)
+        if data.isascii() and b"\x7f" not in data:
+            return data
+        return _NON_ASCII.sub(_escape, data.decode("UTF-8")).encode("ascii")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+BACKENDS: Dict[str, JsonBackend] = {
+    backend.name: backend for backend in (StdlibBackend(), SimplejsonBackend())
+}
+if orjson is not None:
+    BACKENDS[OrjsonBackend.name] = OrjsonBackend()
+
+# the streaming writer uses simplejson as well, faster backends are opt-in
+_default_backend = BACKENDS["simplejson"]
+
+_NON_ASCII = re.compile("[\x7f-\U0010ffff]")
+
+
+def get_backend(backend: Union[str, JsonBackend, None] = None) -> JsonBackend:
+    if backend is None:
+        return _default_backend
+    if isinstance(backend, JsonBackend):
+        return backend
+    try:
+        return BACKENDS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown or unavailable JSON backend {backend!r}, "
+            f"expected one of {sorted(BACKENDS)}"
+        ) from None
+
+
+def set_backend(backend: Union[str, JsonBackend]) -> None:
+    global _default_backend
+    _default_backend = get_backend(backend)
+
+
+def _default(value: Any) -> Optional[str]:
+    # simplejson encodes bytes as UTF-8 strings, match it in the other backends
+    if isinstance(value, bytes):
+        return value.decode("UTF-8")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _escape(match: "re.Match[str]") -> str:
+    # \u escapes as simplejson writes them, with surrogate pairs above U+FFFF
+    code = ord(match.group())
+    if code < 0x10000:
+        return f"\\u{code:04x}"
+    code -= 0x10000
+    return f"\\u{0xD800 | code >> 10:04x}\\u{0xDC00 | code & 0x3FF:04x}"
+
+
+def _plain_floats(arr: Any) -> bool:
+    # True when every float is written the same by orjson and simplejson
+    stack = [arr]
+    while stack:
+        for val in stack.pop():
+            kind = type(val)
+            if kind is list:
+                stack.append(val)
+            elif kind is float:
+                if val and not 1e-4 <= abs(val) < 1e16:  # also NaN and Infinity
+                    return False
+            elif kind is dict:
+                stack.append(list(val.values()))
+    return True
@@ -0,0 +1,104 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple, Type, Union
+from google.protobuf.message import Message
+
+from .plan import precompile
+from .serializer import deserialize_arr2msg, serialize_msg2arr
+
+
+BATCH_SIZE = 256
+
+ExecutorArg = Union[str, Executor]
+
+
+def serialize_many(
+    messages: Iterable[Message],
+    workers: Optional[int] = None,
+    executor: ExecutorArg = "process",
+    batch_size: int = BATCH_SIZE,
+) -> List[str]:
+    batches = _batches(messages, batch_size)
+    if _uses_processes(executor, workers):
+        # messages cross the process boundary in binary wire format, with
+        # their class as a batch may mix message types
+        jobs = (
+            [(type(msg), msg.SerializeToString()) for msg in batch] for batch in batches
+        )
+        return _run(_serialize_binary_batch, jobs, workers, executor)
+    jobs = ((type(batch[0]), batch) for batch in batches)
+    return _run(_serialize_batch, jobs, workers, executor)
+
+
+def deserialize_many(
+    strings: Iterable[str],
+    message_cls: Type[Message],
+    workers: Optional[int] = None,
+    executor: ExecutorArg = "process",
+    batch_size: int = BATCH_SIZE,
+) -> List[Message]:
+    jobs = ((message_cls, batch) for batch in _batches(strings, batch_size))
+    if _uses_processes(executor, workers):
+        results = _run(_deserialize_binary_batch, jobs, workers, executor)
+        return [message_cls.FromString(data) for data in results]
+    return _run(_deserialize_batch, jobs, workers, executor)
+
+
+def _uses_processes(executor: ExecutorArg, workers: Optional[int]) -> bool:
+    if isinstance(executor, Executor):
+        return isinstance(executor, ProcessPoolExecutor)
+    return executor == "process" and workers != 1
+
+
+def _run(fn, jobs: Iterator, workers: Optional[int], executor: ExecutorArg) -> list:
+    results: list = []
+    if isinstance(executor, Executor):
+        for batch in executor.map(fn, jobs):
+            results.extend(batch)
+        return results
+
+    if workers == 1:
+        for job in jobs:
+            results.extend(fn(job))
+        return results
+
+    if executor == "process":
+        pool = ProcessPoolExecutor(max_workers=workers)
+    elif executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown executor: {executor!r}")
+    with pool:
+        for batch in pool.map(fn, jobs):
+            results.extend(batch)
+    return results
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _serialize_batch(job: tuple) -> List[str]:
+    message_cls, messages = job
+    precompile(message_cls)
+    return [serialize_msg2arr(msg) for msg in messages]
+
+
+def _serialize_binary_batch(job: List[Tuple[Type[Message], bytes]]) -> List[str]:
+    for message_cls in {message_cls for message_cls, _ in job}:
+        precompile(message_cls)
+    return [
+        serialize_msg2arr(message_cls.FromString(data)) for message_cls, data in job
+    ]
+
+
+def _deserialize_batch(job: tuple) -> List[Message]:
+    message_cls, strings = job
+    precompile(message_cls)
+    return [deserialize_arr2msg(arr_str, message_cls()) for arr_str in strings]
+
+
+def _deserialize_binary_batch(job: tuple) -> List[bytes]:
+    return [msg.SerializeToString() for msg in _deserialize_batch(job)]
@@ -0,0 +1,81 @@
+import simplejson as json
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+from urllib.parse import urlencode
+from google.protobuf.message import Message
+
+from .reader import ArrReader, Source
+from .serializer import deserialize_arr2msg, serialize_msg2arr
+
+
+GUARD = ")]}'"
+RESULT_KEY = "wrb.fr"
+GENERIC_INDEX = "generic"
+
+
+class RpcResult(NamedTuple):
+    rpc_id: str
+    payload: Optional[str]
+    index: str
+
+
+def iter_batchexecute(source: Source) -> Iterator[RpcResult]:
+    # Chunk lengths are skipped, each chunk is read as one JSON value instead so
+    # rows are yielded as soon as their chunk has arrived.
+    reader = ArrReader(source)
+    if reader.peek() == GUARD[0]:
+        for char in GUARD:
+            reader.consume(char)
+
+    while char := reader.peek():
+        if char != "[":
+            reader.value()  # chunk length
+            continue
+        for row in reader.value():
+            if isinstance(row, list) and row and row[0] == RESULT_KEY:
+                yield _rpc_result(row)
+
+
+def iter_batchexecute_messages(
+    source: Source, message_types: Dict[str, Type[Message]]
+) -> Iterator[Tuple[RpcResult, Optional[Message]]]:
+    for result in iter_batchexecute(source):
+        message_cls = message_types.get(result.rpc_id)
+        if message_cls is None or result.payload is None:
+            yield result, None
+        else:
+            yield result, deserialize_arr2msg(result.payload, message_cls())
+
+
+def build_batchexecute_request(calls: Iterable[Tuple[str, Message]]) -> str:
+    calls = list(calls)
+    rows: List[list] = []
+    for idx, (rpc_id, message) in enumerate(calls, start=1):
+        index = GENERIC_INDEX if len(calls) == 1 else str(idx)
+        rows.append([rpc_id, serialize_msg2arr(message), None, index])
+    return json.dumps([rows], separators=(",", ":"))
+
+
+def build_batchexecute_body(
+    calls: Iterable[Tuple[str, Message]], at: Optional[str] = None
+) -> str:
+    form = {"f.req": build_batchexecute_request(calls)}
+    if at is not None:
+        form["at"] = at
+    return urlencode(form)
+
+
+def frame_batchexecute_response(results: Iterable[RpcResult]) -> str:
+    parts = [GUARD, "\n"]
+    for result in results:
+        row = [RESULT_KEY, result.rpc_id, result.payload, None, None, None]
+        chunk = json.dumps([row + [result.index]], separators=(",", ":"))
+        parts.append(f"\n{len(chunk) + 1}\n{chunk}")
+    parts.append("\n")
+    return "".join(parts)
+
+
+def _rpc_result(row: list) -> RpcResult:
+    rpc_id = row[1] if len(row) > 1 else None
+    payload = row[2] if len(row) > 2 else None
+    index = row[6] if len(row) > 6 else GENERIC_INDEX
+    return RpcResult(rpc_id, payload, index)
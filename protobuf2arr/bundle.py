@@ -0,0 +1,209 @@
+import argparse
+import base64
+import importlib
+import simplejson as json
+from typing import Any, Dict, Iterable, List, Optional, Set, Type, Union
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from google.protobuf.descriptor import FileDescriptor
+from google.protobuf.message import Message
+
+from .plan import NULLABLE_KEY, install_bundled
+from .wire import LENGTH, _read_varint, _skip
+
+
+BUNDLE_VERSION = 1
+OPTIONS_EXTENDEE = ".google.protobuf.FieldOptions"
+
+Source = Union[Type[Message], FileDescriptor, descriptor_pb2.FileDescriptorSet, bytes]
+
+
+class SchemaBundle:
+    def __init__(self, data: Dict[str, Any]) -> None:
+        if data.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported schema bundle version {data.get('version')}")
+        # [[number, name, type, label, nullable values, message type or None]]
+        # by message full name
+        self.messages: Dict[str, List[list]] = data["messages"]
+        self._descriptors: str = data["descriptors"]
+        self._factory: Optional[message_factory.MessageFactory] = None
+        self._classes: Dict[str, Type[Message]] = {}
+
+    def install(self) -> None:
+        install_bundled(self.messages)
+
+    def message_class(self, full_name: str) -> Type[Message]:
+        # imported *_pb2 classes win, the bundled files are only loaded into
+        # a pool of their own when a message is not available otherwise
+        cls = self._classes.get(full_name)
+        if cls is None:
+            try:
+                descriptor = descriptor_pool.Default().FindMessageTypeByName(full_name)
+                cls = descriptor._concrete_class
+            except KeyError:
+                factory = self._message_factory()
+                descriptor = factory.pool.FindMessageTypeByName(full_name)
+                cls = factory.GetPrototype(descriptor)
+            self._classes[full_name] = cls
+        return cls
+
+    def _message_factory(self) -> message_factory.MessageFactory:
+        if self._factory is None:
+            file_set = descriptor_pb2.FileDescriptorSet.FromString(
+                base64.b64decode(self._descriptors)
+            )
+            pool = descriptor_pool.DescriptorPool()
+            for file_proto in file_set.file:
+                pool.Add(file_proto)
+            self._factory = message_factory.MessageFactory(pool)
+        return self._factory
+
+
+def compile_bundle(*sources: Source) -> bytes:
+    file_set = descriptor_pb2.FileDescriptorSet()
+    seen: Set[str] = set()
+    for source in sources:
+        if isinstance(source, bytes):
+            source = descriptor_pb2.FileDescriptorSet.FromString(source)
+        if isinstance(source, descriptor_pb2.FileDescriptorSet):
+            files = list(source.file)
+        elif isinstance(source, FileDescriptor):
+            files = _file_protos(source)
+        else:
+            files = _file_protos(source.DESCRIPTOR.file)
+        for file_proto in files:
+            if file_proto.name not in seen:
+                seen.add(file_proto.name)
+                file_set.file.add().CopyFrom(file_proto)
+
+    numbers = {
+        ext.number
+        for file_proto in file_set.file
+        for ext in _extensions(file_proto)
+        if ext.name == NULLABLE_KEY and ext.extendee == OPTIONS_EXTENDEE
+    }
+    messages: Dict[str, List[list]] = {}
+    for file_proto in file_set.file:
+        prefix = f".{file_proto.package}" if file_proto.package else ""
+        for message_proto in file_proto.message_type:
+            _add_message(messages, prefix, message_proto, numbers)
+
+    data = {
+        "version": BUNDLE_VERSION,
+        "messages": messages,
+        "descriptors": base64.b64encode(file_set.SerializeToString()).decode("ascii"),
+    }
+    return json.dumps(data, separators=(",", ":")).encode("UTF-8")
+
+
+def write_bundle(path: str, *sources: Source) -> None:
+    with open(path, "wb") as fp:
+        fp.write(compile_bundle(*sources))
+
+
+def load_bundle(source: Union[str, bytes], install: bool = True) -> SchemaBundle:
+    if isinstance(source, str):
+        with open(source, "rb") as fp:
+            source = fp.read()
+    bundle = SchemaBundle(json.loads(source))
+    if install:
+        bundle.install()
+    return bundle
+
+
+def _file_protos(file: FileDescriptor) -> List[descriptor_pb2.FileDescriptorProto]:
+    # dependencies first, as protoc --include_imports writes them
+    result: List[descriptor_pb2.FileDescriptorProto] = []
+    seen: Set[str] = set()
+
+    def visit(file: FileDescriptor) -> None:
+        if file.name in seen:
+            return
+        seen.add(file.name)
+        for dependency in file.dependencies:
+            visit(dependency)
+        file_proto = descriptor_pb2.FileDescriptorProto()
+        file.CopyToProto(file_proto)
+        result.append(file_proto)
+
+    visit(file)
+    return result
+
+
+def _extensions(
+    file_proto: descriptor_pb2.FileDescriptorProto,
+) -> Iterable[descriptor_pb2.FieldDescriptorProto]:
+    yield from file_proto.extension
+    pending = list(file_proto.message_type)
+    while pending:
+        message_proto = pending.pop()
+        yield from message_proto.extension
+        pending.extend(message_proto.nested_type)
+
+
+def _add_message(
+    messages: Dict[str, List[list]],
+    prefix: str,
+    message_proto: descriptor_pb2.DescriptorProto,
+    numbers: Set[int],
+) -> None:
+    full_name = f"{prefix}.{message_proto.name}"
+    messages[full_name.lstrip(".")] = [
+        [
+            field.number,
+            field.name,
+            field.type,
+            field.label,
+            _nullable(field.options, numbers),
+            field.type_name.lstrip(".") or None,
+        ]
+        for field in message_proto.field
+    ]
+    for nested in message_proto.nested_type:
+        _add_message(messages, full_name, nested, numbers)
+
+
+def _nullable(options: descriptor_pb2.FieldOptions, numbers: Set[int]) -> List[str]:
+    # read from the wire so the extensions need not be registered here
+    values: List[str] = []
+    if not numbers:
+        return values
+    buf = memoryview(options.SerializeToString())
+    pos = 0
+    while pos < len(buf):
+        tag, pos = _read_varint(buf, pos)
+        if tag >> 3 in numbers and tag & 7 == LENGTH:
+            size, pos = _read_varint(buf, pos)
+            values.append(buf[pos : pos + size].tobytes().decode("UTF-8"))
+            pos += size
+        else:
+            pos = _skip(buf, pos, tag & 7, tag >> 3)
+    return values
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m protobuf2arr.bundle",
+        description="Compile *_pb2 modules or descriptor sets into a schema bundle.",
+    )
+    parser.add_argument("output", help="bundle file to write")
+    parser.add_argument("modules", nargs="*", help="importable *_pb2 module names")
+    parser.add_argument(
+        "--descriptor-set",
+        action="append",
+        default=[],
+        help="protoc --descriptor_set_out file, with --include_imports",
+    )
+    args = parser.parse_args(argv)
+
+    sources: List[Source] = [
+        importlib.import_module(name).DESCRIPTOR for name in args.modules
+    ]
+    for path in args.descriptor_set:
+        with open(path, "rb") as fp:
+            sources.append(fp.read())
+    write_bundle(args.output, *sources)
+    print(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import importlib
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from time import perf_counter
+from typing import IO, Callable, Iterator, List, Optional, Tuple, Type
+from google.protobuf import json_format
+from google.protobuf.internal import encoder
+from google.protobuf.message import DecodeError, Message
+
+from .backends import get_backend
+from .serializer import arr_to_msg, msg_to_arr
+from .wire import _read_varint, arr_to_binary, binary_to_arr
+
+
+# newline-delimited array JSON, length-delimited binary, newline-delimited
+# protobuf JSON
+FORMATS = ("arr", "binary", "json")
+
+# approximate input bytes per work item
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# (input path, message spec, source format, target format, start, end)
+Job = Tuple[str, str, str, str, int, int]
+
+
+@lru_cache(maxsize=None)
+def load_message_cls(spec: str) -> Type[Message]:
+    module_name, sep, name = spec.partition(":")
+    if not sep or not name:
+        raise ValueError(f"Expected module:Class, got {spec!r}")
+    obj = importlib.import_module(module_name)
+    for part in name.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def convert_file(
+    spec: str,
+    path: str,
+    out: IO[bytes],
+    source: str,
+    target: str,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Tuple[int, int]:
+    # returns the number of records and output bytes, ranges are converted in
+    # parallel and written in input order
+    for fmt in (source, target):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt!r}")
+    load_message_cls(spec)
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return 0, 0
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            ranges = split_ranges(buf, source, chunk_size)
+    jobs = [(path, spec, source, target, start, end) for start, end in ranges]
+
+    records = size = 0
+    pool = None if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    try:
+        results = (
+            map(convert_range, jobs) if pool is None else pool.map(convert_range, jobs)
+        )
+        for count, data in results:
+            out.write(data)
+            records, size = records + count, size + len(data)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return records, size
+
+
+def split_ranges(buf: mmap.mmap, fmt: str, chunk_size: int) -> List[Tuple[int, int]]:
+    # byte ranges of about chunk_size that hold whole records
+    ranges = []
+    start, size = 0, len(buf)
+    if fmt != "binary":
+        while start < size:
+            idx = buf.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if idx < 0 else idx + 1
+            ranges.append((start, end))
+            start = end
+        return ranges
+
+    with memoryview(buf) as view:
+        pos = 0
+        while pos < size:
+            length, pos = _read_varint(view, pos)
+            pos += length
+            if pos > size:
+                raise DecodeError("Truncated message.")
+            if pos - start >= chunk_size:
+                ranges.append((start, pos))
+                start = pos
+    if start < size:
+        ranges.append((start, size))
+    return ranges
+
+
+def convert_range(job: Job) -> Tuple[int, bytes]:
+    path, spec, source, target, start, end = job
+    convert = _converter(spec, source, target)
+    out = bytearray()
+    count = 0
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for record in _records(buf, source, start, end):
+                data = convert(record)
+                if target == "binary":
+                    out += encoder._VarintBytes(len(data))
+                    out += data
+                else:
+                    out += data
+                    out += b"\n"
+                count += 1
+    return count, bytes(out)
+
+
+def _records(buf: mmap.mmap, fmt: str, start: int, end: int) -> Iterator[bytes]:
+    if fmt != "binary":
+        for line in buf[start:end].splitlines():
+            if line.strip():
+                yield line
+        return
+    with memoryview(buf) as view:
+        pos = start
+        while pos < end:
+            length, pos = _read_varint(view, pos)
+            yield view[pos : pos + length].tobytes()
+            pos += length
+
+
+@lru_cache(maxsize=None)
+def _converter(spec: str, source: str, target: str) -> Callable[[bytes], bytes]:
+    message_cls = load_message_cls(spec)
+    descriptor = message_cls.DESCRIPTOR
+    backend = get_backend()
+
+    # array and binary transcode without building messages
+    if source == "arr" and target == "binary":
+        return lambda record: arr_to_binary(backend.loads(record), descriptor)
+    if source == "binary" and target == "arr":
+        return lambda record: backend.dumps_bytes(binary_to_arr(record, descriptor))
+
+    read: Callable[[bytes], Message] = {
+        "arr": lambda record: arr_to_msg(backend.loads(record), message_cls()),
+        "binary": message_cls.FromString,
+        "json": lambda record: json_format.Parse(record, message_cls()),
+    }[source]
+    write: Callable[[Message], bytes] = {
+        "arr": lambda msg: backend.dumps_bytes(msg_to_arr(msg)),
+        "binary": lambda msg: msg.SerializeToString(),
+        "json": lambda msg: json_format.MessageToJson(msg, indent=None).encode("UTF-8"),
+    }[target]
+    return lambda record: write(read(record))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="protobuf2arr",
+        description="Convert files of messages between newline-delimited array "
+        "JSON, length-delimited protobuf binary and newline-delimited JSON.",
+    )
+    parser.add_argument("message", help="message class as module:Class")
+    parser.add_argument("input", help="file to convert")
+    parser.add_argument("output", help="file to write, - for stdout")
+    parser.add_argument("--from", dest="source", choices=FORMATS, required=True)
+    parser.add_argument("--to", dest="target", choices=FORMATS, required=True)
+    parser.add_argument(
+        "--workers", type=int, help="worker processes, 1 converts in this process"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="approximate input bytes per work item",
+    )
+    parser.add_argument("--quiet", action="store_true", help="no throughput report")
+    args = parser.parse_args(argv)
+
+    # console scripts do not put the working directory on the path
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    start = perf_counter()
+    if args.output == "-":
+        output = nullcontext(sys.stdout.buffer)
+    else:
+        output = open(args.output, "wb")
+    with output as out:
+        records, size = convert_file(
+            args.message,
+            args.input,
+            out,
+            args.source,
+            args.target,
+            args.workers,
+            args.chunk_size,
+        )
+        out.flush()
+    seconds = max(perf_counter() - start, 1e-9)
+
+    if not args.quiet:
+        read = os.path.getsize(args.input)
+        print(
+            f"{records} records, {read / 1e6:.1f} MB in, {size / 1e6:.1f} MB out "
+            f"in {seconds:.2f}s ({read / 1e6 / seconds:.1f} MB/s, "
+            f"{records / seconds:.0f} records/s)",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
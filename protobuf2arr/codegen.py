@@ -0,0 +1,316 @@
+import argparse
+import importlib
+import math
+import os
+from keyword import iskeyword
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Type
+from google.protobuf.message import Message
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+
+from .plan import (
+    ARR_SUFFIX,
+    PB2_SUFFIX,
+    decode_plan,
+    encode_plan,
+    field_schema,
+    install_generated,
+    schema_hash,
+)
+
+
+HEADER = "# Generated by protobuf2arr.codegen.  DO NOT EDIT!"
+
+# generated functions call each other once per nesting level, deeper sub-trees
+# continue on the iterative plans
+INLINE_DEPTH = 64
+
+
+def install(*message_classes: Type[Message]) -> None:
+    descriptors = _reachable([cls.DESCRIPTOR for cls in message_classes])
+    source = generate_source(descriptors)
+    namespace = _namespace(descriptors)
+    exec(compile(source, "<protobuf2arr.codegen>", "exec"), namespace)
+    install_generated(namespace["_FUNCTIONS"])
+
+
+def generate_source(descriptors: List[Descriptor]) -> str:
+    # the source expects `_descriptors` and the names from _namespace() in scope
+    index = {descriptor: idx for idx, descriptor in enumerate(descriptors)}
+    lines: List[str] = []
+    for idx, descriptor in enumerate(descriptors):
+        lines.extend(_constants(idx, descriptor))
+    for idx, descriptor in enumerate(descriptors):
+        lines.append("")
+        lines.append("")
+        lines.extend(_encoder(idx, descriptor, index))
+        lines.append("")
+        lines.append("")
+        lines.extend(_decoder(idx, descriptor, index))
+    lines.append("")
+    lines.append("")
+    lines.append("_FUNCTIONS = {")
+    for idx in range(len(descriptors)):
+        lines.append(f"    _descriptors[{idx}]: (_encode_{idx}, _decode_{idx}),")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_module(module: ModuleType) -> str:
+    # top-level messages of a *_pb2 module, plus every message they reach
+    descriptors = _reachable(list(module.DESCRIPTOR.message_types_by_name.values()))
+    imports = sorted({_module_name(descriptor) for descriptor in descriptors})
+    lines = [
+        HEADER,
+        "from protobuf2arr.codegen import _namespace",
+        "from protobuf2arr.plan import install_generated",
+    ]
+    lines.extend(f"import {name}" for name in imports)
+    lines.append("")
+    lines.append("_descriptors = [")
+    for descriptor in descriptors:
+        path = descriptor.full_name[len(descriptor.file.package) :].lstrip(".")
+        lines.append(f"    {_module_name(descriptor)}.{path}.DESCRIPTOR,")
+    lines.append("]")
+    lines.append("globals().update(_namespace(_descriptors))")
+    # checked on import, code generated for an older schema is not installed
+    lines.append(f"_SCHEMA = {schema_hash(descriptors)!r}")
+    lines.append("")
+    lines.append(generate_source(descriptors))
+    lines.append("install_generated(_FUNCTIONS, _SCHEMA)")
+    return "\n".join(lines) + "\n"
+
+
+def write_module(module: ModuleType, path: Optional[str] = None) -> str:
+    if path is None:
+        base = os.path.splitext(module.__file__)[0]
+        if base.endswith(PB2_SUFFIX):
+            base = base[: -len(PB2_SUFFIX)]
+        path = base + ARR_SUFFIX + ".py"
+    with open(path, "w") as fp:
+        fp.write(generate_module(module))
+    return path
+
+
+def _namespace(descriptors: List[Descriptor]) -> Dict[str, Any]:
+    namespace: Dict[str, Any] = {"_descriptors": descriptors, "_padding": _padding}
+    for idx, descriptor in enumerate(descriptors):
+        namespace[f"_run_{idx}"] = encode_plan(descriptor).run
+        namespace[f"_rund_{idx}"] = decode_plan(descriptor).run
+        namespace[f"_fill_{idx}"] = decode_plan(descriptor).fill_defaults
+        for field in descriptor.fields:
+            if field.type == field.TYPE_MESSAGE:
+                matcher = field_schema(field).matcher
+                namespace[f"_m_{idx}_{field.number}"] = matcher
+    return namespace
+
+
+def _constants(idx: int, descriptor: Descriptor) -> List[str]:
+    lines = []
+    for field in descriptor.fields:
+        if field.type == field.TYPE_MESSAGE:
+            continue
+        schema = field_schema(field)
+        if defaults := schema.nullable:
+            lines.append(f"_n_{idx}_{field.number} = frozenset({_literal(defaults)})")
+        if default := schema.default:
+            lines.append(f"_d_{idx}_{field.number} = {_literal(default[1])}")
+    return lines
+
+
+def _encoder(
+    idx: int, descriptor: Descriptor, index: Dict[Descriptor, int]
+) -> List[str]:
+    lines = [
+        f"def _encode_{idx}(obj, depth=0):",
+        f"    if depth > {INLINE_DEPTH}:",
+        f"        return _run_{idx}(obj)",
+        "    return [",
+    ]
+    length = 0
+    for field in descriptor.fields:
+        pos = field.number - 1
+        if pos - length == 1:
+            lines.append("        None,")
+        elif pos > length:
+            lines.append(f"        *[None] * {pos - length},")
+        length = max(pos, length) + 1
+        lines.append(f"        {_encode_expr(idx, field, index)},")
+    lines.append("    ]")
+    return lines
+
+
+def _encode_expr(idx: int, field: FieldDescriptor, index: Dict[Descriptor, int]) -> str:
+    value = _get("obj", field.name)
+    key = f"{idx}_{field.number}"
+    repeated = field.label == field.LABEL_REPEATED
+
+    if field.type == field.TYPE_MESSAGE:
+        sub = f"_encode_{index[field.message_type]}"
+        matcher = field_schema(field).matcher
+        if repeated:
+            if matcher is None:
+                return f"[{sub}(item, depth + 1) for item in {value}]"
+            return (
+                f"[None if _m_{key}(item) else {sub}(item, depth + 1) "
+                f"for item in {value}]"
+            )
+        if matcher is None:
+            return f"{sub}({value}, depth + 1)"
+        return f"None if _m_{key}(val := {value}) else {sub}(val, depth + 1)"
+
+    if not field_schema(field).nullable:
+        return f"list({value})" if repeated else value
+    if repeated:
+        return f"None if str(val := {value}) in _n_{key} else list(val)"
+    if field.type == field.TYPE_BYTES:
+        return (
+            f'None if str(val := {value}, "UTF-8") in _n_{key} '
+            f"or str(val) in _n_{key} else val"
+        )
+    return f"None if str(val := {value}) in _n_{key} else val"
+
+
+def _decoder(
+    idx: int, descriptor: Descriptor, index: Dict[Descriptor, int]
+) -> List[str]:
+    lines = [
+        f"def _decode_{idx}(arr, msg, depth=0):",
+        f"    if depth > {INLINE_DEPTH}:",
+        f"        return _rund_{idx}(arr, msg)",
+        "    n = len(arr)",
+    ]
+    fields = {field.number - 1: field for field in descriptor.fields}
+    known = 0
+    for pos in sorted(fields):
+        if pos > known:
+            lines.append(f"    if n > {known}:")
+            lines.append(f"        _padding(arr, {known}, {pos})")
+        lines.append(f"    if n > {pos}:")
+        lines.append(f"        val = arr[{pos}]")
+        lines.extend(
+            "        " + line for line in _decode_lines(idx, fields[pos], index)
+        )
+        known = pos + 1
+    lines.append(f"    if n > {known}:")
+    lines.append(f"        _padding(arr, {known}, n)")
+    lines.append("    return msg")
+    return lines
+
+
+def _decode_lines(
+    idx: int, field: FieldDescriptor, index: Dict[Descriptor, int]
+) -> List[str]:
+    key = f"{idx}_{field.number}"
+    repeated = field.label == field.LABEL_REPEATED
+
+    if field.type == field.TYPE_MESSAGE:
+        sub = index[field.message_type]
+        if repeated:
+            return [
+                "if val is not None:",
+                f"    container = {_get('msg', field.name)}",
+                "    for item in val:",
+                "        model = container.add()",
+                "        if item is None:",
+                f"            _fill_{sub}(model)",
+                "        else:",
+                f"            _decode_{sub}(item, model, depth + 1)",
+            ]
+        return [
+            f"model = {_get('msg', field.name)}",
+            "if val is None:",
+            "    model.SetInParent()",
+            f"    _fill_{sub}(model)",
+            "else:",
+            f"    _decode_{sub}(val, model, depth + 1)",
+        ]
+
+    lines = []
+    default = field_schema(field).default
+    if default is not None:
+        lines.extend(
+            ["if val is None:", "    " + _assign(field, f"_d_{key}", default[1])]
+        )
+        lines.append("else:")
+    else:
+        lines.append("if val is not None:")
+    if field.type == field.TYPE_BYTES:
+        lines.append("    if isinstance(val, str):")
+        lines.append('        val = val.encode("UTF-8")')
+    if repeated:
+        lines.append("    if isinstance(val, list):")
+        lines.append(f"        {_get('msg', field.name)}.extend(val)")
+        lines.append("    else:")
+        lines.append(f"        {_set('msg', field.name, 'val')}")
+    else:
+        lines.append(f"    {_set('msg', field.name, 'val')}")
+    return lines
+
+
+def _padding(arr: List[Any], start: int, stop: int) -> None:
+    # positions of numbers missing in the schema only take None
+    padding = arr[start:stop]
+    if padding.count(None) != len(padding):
+        for pos, item in enumerate(padding, start):
+            if item is not None:
+                raise KeyError(pos + 1)
+
+
+def _assign(field: FieldDescriptor, name: str, value: Any) -> str:
+    if field.label == field.LABEL_REPEATED and isinstance(value, list):
+        return f"{_get('msg', field.name)}.extend({name})"
+    return _set("msg", field.name, name)
+
+
+def _get(obj: str, name: str) -> str:
+    return f"getattr({obj}, {name!r})" if iskeyword(name) else f"{obj}.{name}"
+
+
+def _set(obj: str, name: str, value: str) -> str:
+    if iskeyword(name):
+        return f"setattr({obj}, {name!r}, {value})"
+    return f"{obj}.{name} = {value}"
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, float) and not math.isfinite(value):
+        return f"float({str(value)!r})"
+    if isinstance(value, list):
+        return "[" + ", ".join(_literal(item) for item in value) + "]"
+    return repr(value)
+
+
+def _reachable(roots: List[Descriptor]) -> List[Descriptor]:
+    result: List[Descriptor] = []
+    pending = list(reversed(roots))
+    while pending:
+        descriptor = pending.pop()
+        if descriptor in result:
+            continue
+        result.append(descriptor)
+        pending.extend(
+            field.message_type
+            for field in reversed(descriptor.fields)
+            if field.type == field.TYPE_MESSAGE
+        )
+    return result
+
+
+def _module_name(descriptor: Descriptor) -> str:
+    return descriptor._concrete_class.__module__
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m protobuf2arr.codegen",
+        description="Write *_arr.py encoders/decoders next to *_pb2.py modules.",
+    )
+    parser.add_argument("modules", nargs="+", help="importable *_pb2 module names")
+    args = parser.parse_args(argv)
+    for name in args.modules:
+        print(write_module(importlib.import_module(name)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from google.protobuf.descriptor import Descriptor
+
+from .plan import encode_plan, message_schema, plan_cache
+
+
+# checked by the serializer before taking any measurement
+enabled = False
+
+
+class Event(NamedTuple):
+    operation: str
+    message: str
+    seconds: float
+    size: Optional[int]
+    # nullable hits by field full name, msg_to_arr only
+    nullable: Dict[str, int]
+
+
+class MessageStats:
+    __slots__ = ("calls", "seconds", "size", "nullable", "histogram")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.size = 0
+        self.nullable = 0
+        # payload sizes by power of two upper bound
+        self.histogram: Dict[int, int] = {}
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.messages: Dict[Tuple[str, str], MessageStats] = {}
+        self.fields: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, event: Event) -> None:
+        with self._lock:
+            key = (event.operation, event.message)
+            stats = self.messages.get(key)
+            if stats is None:
+                stats = self.messages[key] = MessageStats()
+            stats.calls += 1
+            stats.seconds += event.seconds
+            if event.size is not None:
+                stats.size += event.size
+                bucket = 1 << event.size.bit_length()
+                stats.histogram[bucket] = stats.histogram.get(bucket, 0) + 1
+            if event.nullable:
+                stats.nullable += sum(event.nullable.values())
+                self.fields.update(event.nullable)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.messages.clear()
+            self.fields.clear()
+
+    def report(self, limit: Optional[int] = None) -> str:
+        rows = sorted(self.messages.items(), key=lambda item: -item[1].seconds)
+        lines = [
+            f"{'operation':<24} {'message':<40} {'calls':>8} {'seconds':>10} "
+            f"{'bytes':>12} {'nullable':>9}"
+        ]
+        for (operation, message), stats in rows[:limit]:
+            lines.append(
+                f"{operation:<24} {message:<40} {stats.calls:>8} "
+                f"{stats.seconds:>10.4f} {stats.size:>12} {stats.nullable:>9}"
+            )
+        return "\n".join(lines)
+
+
+STATS = Stats()
+
+_collectors: List[Stats] = []
+_hooks: List[Callable[[Event], None]] = []
+
+
+def enable() -> None:
+    if STATS not in _collectors:
+        _collectors.append(STATS)
+    _refresh()
+
+
+def disable() -> None:
+    if STATS in _collectors:
+        _collectors.remove(STATS)
+    _refresh()
+
+
+def add_hook(hook: Callable[[Event], None]) -> None:
+    _hooks.append(hook)
+    _refresh()
+
+
+def remove_hook(hook: Callable[[Event], None]) -> None:
+    _hooks.remove(hook)
+    _refresh()
+
+
+@contextmanager
+def profile() -> Iterator[Stats]:
+    stats = Stats()
+    _collectors.append(stats)
+    _refresh()
+    try:
+        yield stats
+    finally:
+        _collectors.remove(stats)
+        _refresh()
+
+
+def observe(
+    operation: str,
+    descriptor: Descriptor,
+    start: float,
+    size: Optional[int] = None,
+    arr: Optional[List[Any]] = None,
+) -> None:
+    seconds = perf_counter() - start
+    nullable = {} if arr is None else _nullable_hits(descriptor, arr)
+    event = Event(operation, descriptor.full_name, seconds, size, nullable)
+    for collector in _collectors:
+        collector.add(event)
+    for hook in _hooks:
+        hook(event)
+
+
+def _refresh() -> None:
+    global enabled
+    enabled = bool(_collectors or _hooks)
+
+
+def _nullable_hits(descriptor: Descriptor, arr: List[Any]) -> Dict[str, int]:
+    # walks a full-layout array and counts None values at nullable fields
+    hits: Dict[str, int] = {}
+    stack = [(descriptor, arr)]
+    while stack:
+        descriptor, arr = stack.pop()
+        for pos, name, nullable, sub, repeated in _positions(descriptor):
+            if pos >= len(arr):
+                break
+            val = arr[pos]
+            if val is None:
+                if nullable:
+                    hits[name] = hits.get(name, 0) + 1
+            elif sub is not None:
+                if repeated:
+                    items = [item for item in val if item is not None]
+                    hits[name] = hits.get(name, 0) + len(val) - len(items)
+                    stack.extend((sub, item) for item in items)
+                else:
+                    stack.append((sub, val))
+    return {name: count for name, count in hits.items() if count}
+
+
+@plan_cache
+def _positions(
+    descriptor: Descriptor,
+) -> List[Tuple[int, str, bool, Optional[Descriptor], bool]]:
+    # (array position, field full name, nullable, sub-message, repeated), with
+    # positions assigned as in EncodePlan
+    result = []
+    pos = -1
+    schema = message_schema(descriptor)
+    for name, padding, _, sub in encode_plan(descriptor).steps:
+        pos += len(padding) + 1
+        field = schema[name].field
+        sub_descriptor = None if sub is None else sub[0]
+        repeated = field.label == field.LABEL_REPEATED
+        nullable = bool(schema[name].nullable)
+        result.append((pos, field.full_name, nullable, sub_descriptor, repeated))
+    return result
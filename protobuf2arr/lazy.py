@@ -0,0 +1,122 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+from google.protobuf.message import Message
+from google.protobuf.descriptor import Descriptor
+
+from .plan import FieldSchema, decode_plan, message_schema, plan_cache
+from .serializer import arr_to_msg
+
+
+# position past the end of a full-layout array, the field is left unset
+MISSING = object()
+
+Converter = Callable[[Any, "LazyArrView"], Any]
+
+
+class LazyArrView:
+    __slots__ = ("_arr", "_message_cls", "_compact", "_active", "_fields", "_cache")
+
+    def __init__(
+        self,
+        arr: Optional[List[Any]],
+        message_cls: Type[Message],
+        compact: bool = False,
+        _active: frozenset = frozenset(),
+    ) -> None:
+        # arr is None for a None-type message, every field reads as null and
+        # _active holds the enclosing None-type message types, as in fill_defaults
+        self._arr = arr
+        self._message_cls = message_cls
+        self._compact = compact
+        self._active = _active
+        self._fields = view_fields(message_cls.DESCRIPTOR)
+        self._cache: Dict[str, Any] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        try:
+            idx, convert = self._fields[name]
+        except KeyError:
+            raise AttributeError(
+                f"{self._message_cls.__name__} has no field {name!r}"
+            ) from None
+        value = self._cache[name] = convert(self._item(idx), self)
+        return value
+
+    def __repr__(self) -> str:
+        return f"LazyArrView({self._message_cls.__name__}, {self._arr!r})"
+
+    def materialize(self) -> Message:
+        msg = self._message_cls()
+        if self._arr is None:
+            decode_plan(msg.DESCRIPTOR).fill_defaults(msg)
+            return msg
+        return arr_to_msg(self._arr, msg, compact=self._compact)
+
+    def _item(self, idx: int) -> Any:
+        arr = self._arr
+        if arr is None:
+            return None
+        if self._compact and arr and isinstance(arr[-1], dict):
+            if idx < len(arr) - 1:
+                return arr[idx]
+            return arr[-1].get(str(idx + 1))
+        if idx < len(arr):
+            return arr[idx]
+        # compact arrays trim trailing nulls
+        return None if self._compact else MISSING
+
+
+@plan_cache
+def view_fields(descriptor: Descriptor) -> Dict[str, Tuple[int, Converter]]:
+    return {
+        name: (schema.field.number - 1, _field_converter(schema))
+        for name, schema in message_schema(descriptor).items()
+    }
+
+
+def _field_converter(schema: FieldSchema) -> Converter:
+    field = schema.field
+    repeated = field.label == field.LABEL_REPEATED
+
+    if field.type == field.TYPE_MESSAGE:
+        cls = field.message_type._concrete_class
+        if repeated:
+            return lambda item, view: (
+                []
+                if item is None or item is MISSING
+                else [LazyArrView(sub, cls, view._compact) for sub in item]
+            )
+
+        def convert_message(item: Any, view: LazyArrView) -> LazyArrView:
+            # unset sub-messages read as empty, None-type ones as nullable defaults
+            if item is MISSING:
+                return LazyArrView([], cls)
+            if item is not None:
+                return LazyArrView(item, cls, view._compact)
+            if view._arr is not None:
+                return LazyArrView(None, cls, view._compact)
+            active = view._active | {view._message_cls.DESCRIPTOR}
+            if field.message_type in active:  # stop at self-referential types
+                return LazyArrView([], cls)
+            return LazyArrView(None, cls, view._compact, active)
+
+        return convert_message
+
+    default = schema.default
+    is_bytes = field.type == field.TYPE_BYTES
+
+    def convert(item: Any, view: LazyArrView) -> Any:
+        if item is None and default is not None:
+            item = default[1]
+        if item is None or item is MISSING:
+            item = field.default_value
+        if repeated:
+            return list(item) if isinstance(item, list) else [item]
+        if is_bytes and isinstance(item, str):
+            return item.encode("UTF-8")
+        return item
+
+    return convert
@@ -0,0 +1,138 @@
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.internal import type_checkers
+from google.protobuf.message import Message
+
+from .plan import _field_encoder, field_schema, plan_cache
+from .serializer import msg_to_arr
+
+
+# name or name[index]
+PATH_PART = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)(?:\[(\d+)\])?\Z")
+
+
+class PathStep(NamedTuple):
+    pos: int
+    field: FieldDescriptor
+    # item of a repeated field, None for the whole field
+    index: Optional[int]
+    # converts a value for the last step with the typing and nullable rules
+    # of msg_to_arr
+    encode: Optional[Callable[[Any], Any]]
+
+
+def patch_arr(
+    arr: List[Any], message_cls: Type[Message], patches: Dict[str, Any]
+) -> List[Any]:
+    # edits a full-layout array in place, only the patched positions change
+    for path, value in patches.items():
+        steps = path_steps(message_cls.DESCRIPTOR, path)
+        target = arr
+        for step in steps[:-1]:
+            target = _child(target, step)
+        last = steps[-1]
+        value = None if value is None else last.encode(value)
+        container, key = _slot(target, last)
+        container[key] = value
+    return arr
+
+
+@plan_cache
+def path_steps(descriptor: Descriptor, path: str) -> Tuple[PathStep, ...]:
+    parts = path.split(".")
+    steps = []
+    for depth, part in enumerate(parts):
+        match = PATH_PART.match(part)
+        if match is None:
+            raise ValueError(f"Invalid field path {path!r}")
+        name, index = match.groups()
+        field = descriptor.fields_by_name.get(name)
+        if field is None:
+            raise KeyError(f"{descriptor.full_name}.{name}")
+
+        repeated = field.label == field.LABEL_REPEATED
+        if index is not None and not repeated:
+            raise ValueError(f"{field.full_name} is not repeated in {path!r}")
+        last = depth == len(parts) - 1
+        if not last:
+            if field.type != field.TYPE_MESSAGE or (repeated and index is None):
+                raise ValueError(f"{field.full_name} is not a message in {path!r}")
+            descriptor = field.message_type
+
+        index = None if index is None else int(index)
+        encode = _value_encoder(field, index is not None) if last else None
+        steps.append(PathStep(field.number - 1, field, index, encode))
+    return tuple(steps)
+
+
+def _value_encoder(field: FieldDescriptor, item: bool) -> Callable[[Any], Any]:
+    repeated = field.label == field.LABEL_REPEATED and not item
+    schema = field_schema(field)
+
+    if field.type == field.TYPE_MESSAGE:
+        is_default = schema.matcher
+
+        def encode_message(value: Message) -> Optional[List[Any]]:
+            if value.DESCRIPTOR is not field.message_type:
+                raise TypeError(
+                    f"Expected {field.message_type.full_name} for {field.full_name}, "
+                    f"got {value.DESCRIPTOR.full_name}"
+                )
+            if is_default is not None and is_default(value):
+                return None
+            return msg_to_arr(value)
+
+        if repeated:
+            return lambda value: [encode_message(item) for item in value]
+        return encode_message
+
+    check = type_checkers.GetTypeChecker(field).CheckValue
+    if item:  # nullable values apply to the whole repeated field
+        return check
+    handler = _field_encoder(schema)
+    if repeated:
+        return lambda value: handler([check(item) for item in value])
+    if handler is None:
+        return check
+    return lambda value: handler(check(value))
+
+
+def _slot(target: List[Any], step: PathStep) -> Tuple[List[Any], int]:
+    if step.pos >= len(target):
+        target += (None,) * (step.pos + 1 - len(target))
+    if step.index is None:
+        return target, step.pos
+    items = target[step.pos]
+    if items is None or step.index >= len(items):
+        raise IndexError(f"{step.field.full_name}[{step.index}] is out of range")
+    return items, step.index
+
+
+def _child(target: List[Any], step: PathStep) -> List[Any]:
+    unset = step.index is None and step.pos >= len(target)
+    container, key = _slot(target, step)
+    child = container[key]
+    if unset:
+        child = container[key] = []
+    elif child is None:
+        # a null sub-message holds its nullable defaults, spelled out so a
+        # single field can change
+        child = container[key] = _null_arr(step.field.message_type)
+    return child
+
+
+def _null_arr(descriptor: Descriptor, active: frozenset = frozenset()) -> List[Any]:
+    # decodes like None, with sub-messages expanded as in fill_defaults, except
+    # that the empty ones at self-referential types are left unset
+    active = active | {descriptor}
+    arr: List[Any] = []
+    for field in sorted(descriptor.fields, key=lambda field: field.number):
+        arr += (None,) * (field.number - 1 - len(arr))
+        if field.type != field.TYPE_MESSAGE or field.label == field.LABEL_REPEATED:
+            arr.append(None)
+        elif field.message_type in active:
+            arr.append([])
+        else:
+            arr.append(_null_arr(field.message_type, active))
+    return arr
@@ -0,0 +1,665 @@
+import hashlib
+import importlib.util
+import logging
+import simplejson as json
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+)
+from google.protobuf import text_format
+from google.protobuf.message import Message
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+
+from .subtree import ARRAY, Key, SubtreeCache
+
+
+NULLABLE_KEY = "nullable"
+PLAN_CACHE_SIZE = 1024
+
+PB2_SUFFIX = "_pb2"
+ARR_SUFFIX = "_arr"
+
+# encode and decode functions from protobuf2arr.codegen by descriptor
+GENERATED: Dict[Descriptor, Tuple[Callable, Callable]] = {}
+
+# per-descriptor caches built from the schema, cleared together by clear_plans()
+# whenever nullable values change
+PLAN_CACHES: List[Any] = []
+
+
+class BundledField(NamedTuple):
+    number: int
+    nullable: List[str]
+    type: int
+    label: int
+    # sub-message full name
+    message: Optional[str]
+    # (typed nullable default,) or None
+    default: Optional[Tuple[Any]]
+
+
+class FieldSchema(NamedTuple):
+    field: FieldDescriptor
+    nullable: List[str]
+    # (field, typed nullable default) or None
+    default: Optional[Tuple[FieldDescriptor, Any]]
+    # None-type matcher for sub-messages, and whether it only matches empty ones
+    matcher: Optional[Callable[[Message], bool]]
+    empty: bool
+
+
+# field rows by message full name and field name, from protobuf2arr.bundle
+# schema bundles
+BUNDLED: Dict[str, Dict[str, BundledField]] = {}
+
+MessageField = Tuple[Descriptor, bool, Optional[Callable[[Message], bool]]]
+
+
+def plan_cache(fn: Callable) -> Callable:
+    cached = lru_cache(maxsize=PLAN_CACHE_SIZE)(fn)
+    PLAN_CACHES.append(cached)
+    return cached
+
+
+def clear_plans() -> None:
+    for cached in PLAN_CACHES:
+        cached.cache_clear()
+
+
+def install_bundled(messages: Dict[str, List[list]]) -> None:
+    # rows are [number, name, type, label, nullable values, message or None]
+    generated = [d for d in GENERATED if d.full_name in messages]
+    hashes = [schema_hash([descriptor]) for descriptor in generated]
+    for message, rows in messages.items():
+        BUNDLED[message] = {
+            name: BundledField(
+                number,
+                nullable,
+                field_type,
+                label,
+                sub,
+                _bundled_default(field_type, label, name, nullable),
+            )
+            for number, name, field_type, label, nullable, sub in rows
+        }
+    clear_plans()
+    # generated functions inline nullable values and call each other
+    if any(
+        schema_hash([descriptor]) != old for descriptor, old in zip(generated, hashes)
+    ):
+        GENERATED.clear()
+        clear_plans()
+
+
+def nullable_values(field: FieldDescriptor) -> List[str]:
+    return field_schema(field).nullable
+
+
+def field_schema(field: FieldDescriptor) -> FieldSchema:
+    return message_schema(field.containing_type)[field.name]
+
+
+@plan_cache
+def message_schema(descriptor: Descriptor) -> Dict[str, FieldSchema]:
+    # in declaration order, from the bundled rows where they still match the
+    # descriptor and from field options otherwise
+    bundled = BUNDLED.get(descriptor.full_name, {})
+    schema: Dict[str, FieldSchema] = {}
+    for field in descriptor.fields:
+        row = bundled.get(field.name)
+        message = field.message_type
+        if row is not None and (
+            row.number == field.number
+            and row.type == field.type
+            and row.label == field.label
+            and row.message == (message and message.full_name)
+        ):
+            nullable = row.nullable
+            default = None if row.default is None else (field, row.default[0])
+        else:
+            nullable = _option_values(field)
+            value = _bundled_default(field.type, field.label, field.name, nullable)
+            default = None if value is None else (field, value[0])
+
+        matcher, empty = None, False
+        if message is not None:
+            prototypes = nullable_prototypes(message, nullable)
+            matcher = _prototype_matcher(prototypes)
+            empty = prototypes == [[]]
+        schema[field.name] = FieldSchema(field, nullable, default, matcher, empty)
+    return schema
+
+
+def _option_values(field: FieldDescriptor) -> List[str]:
+    if options := field.GetOptions():
+        return [
+            options.Extensions[ext]
+            for ext in options.Extensions
+            if ext.name == NULLABLE_KEY
+        ]
+    return []
+
+
+class EncodePlan:
+    __slots__ = ("descriptor", "steps", "encode")
+
+    def __init__(self, descriptor: Descriptor) -> None:
+        self.descriptor = descriptor
+        # (attribute name, padding to append before the value, value handler,
+        # sub-message (descriptor, repeated, nullable matcher) or None)
+        self.steps: List[
+            Tuple[str, Tuple[None, ...], Optional[Callable], Optional[MessageField]]
+        ] = []
+
+        length = 0
+        for schema in message_schema(descriptor).values():
+            field = schema.field
+            pos = field.number - 1
+            padding = (None,) * max(pos - length, 0)
+            length = max(pos, length) + 1
+
+            if field.type == field.TYPE_MESSAGE:
+                sub = (
+                    field.message_type,
+                    field.label == field.LABEL_REPEATED,
+                    schema.matcher,
+                )
+                self.steps.append((field.name, padding, None, sub))
+            else:
+                self.steps.append((field.name, padding, _field_encoder(schema), None))
+
+        generated = generated_functions(descriptor)
+        self.encode: Callable[[Message], List[Any]] = (
+            self._run if generated is None else generated[0]
+        )
+
+    def run(
+        self,
+        obj: Message,
+        max_depth: Optional[int] = None,
+        cache: Optional[SubtreeCache] = None,
+    ) -> List[Any]:
+        if cache is None:
+            return self._run(obj, max_depth)
+        # sub-trees are filled in after they are reserved, other threads only
+        # see them once the whole array is built, repeats within this message
+        # reuse them from pending
+        pending: Dict[Key, List[Any]] = {}
+        result = self._run(obj, max_depth, cache, pending)
+        for key, value in pending.items():
+            cache.put(key, value)
+        return result
+
+    def _run(
+        self,
+        obj: Message,
+        max_depth: Optional[int] = None,
+        cache: Optional[SubtreeCache] = None,
+        pending: Optional[Dict[Key, List[Any]]] = None,
+    ) -> List[Any]:
+        # sub-messages go on an explicit work stack and are written into the
+        # slot reserved for them, so nesting depth does not use Python frames
+        root: List[Any] = [None]
+        stack = [(self, obj, root, 0, 0)]
+        while stack:
+            plan, obj, target, index, depth = stack.pop()
+            if max_depth is not None and depth > max_depth:
+                raise ValueError(f"Message nesting exceeds max_depth={max_depth}")
+
+            result: List[Any] = []
+            if cache is not None and depth:
+                key = cache.key(ARRAY, obj)
+                if key is not None:
+                    cached = cache.get(key, pending)
+                    if cached is not None:
+                        target[index] = cached
+                        continue
+                    pending[key] = result
+            append = result.append
+            for name, padding, handler, sub in plan.steps:
+                if padding:
+                    result += padding
+                val = getattr(obj, name)
+                if sub is None:
+                    append(val if handler is None else handler(val))
+                    continue
+
+                descriptor, repeated, is_default = sub
+                sub_plan = encode_plan(descriptor)
+                if repeated:
+                    items: List[Any] = []
+                    for item in val:
+                        items.append(None)
+                        if is_default is None or not is_default(item):
+                            task = (sub_plan, item, items, len(items) - 1, depth + 1)
+                            stack.append(task)
+                    append(items)
+                else:
+                    append(None)
+                    if is_default is None or not is_default(val):
+                        task = (sub_plan, val, result, len(result) - 1, depth + 1)
+                        stack.append(task)
+            target[index] = result
+        return root[0]
+
+    def run_compact(
+        self, obj: Message, pivot: Optional[int] = None, max_depth: Optional[int] = None
+    ) -> List[Any]:
+        # like run, but only pads up to the last value that is not None and puts
+        # positions above pivot into a trailing {"<number>": value} object
+        root: List[Any] = [None]
+        stack = [(self, obj, root, 0, 0)]
+        while stack:
+            plan, obj, target, index, depth = stack.pop()
+            if max_depth is not None and depth > max_depth:
+                raise ValueError(f"Message nesting exceeds max_depth={max_depth}")
+
+            result: List[Any] = []
+            extension: Dict[str, Any] = {}
+            number = 0
+            for name, padding, handler, sub in plan.steps:
+                number += len(padding) + 1
+                val = getattr(obj, name)
+                task = None
+                if sub is None:
+                    if handler is not None:
+                        val = handler(val)
+                        if val is None:
+                            continue
+                else:
+                    descriptor, repeated, is_default = sub
+                    sub_plan = encode_plan(descriptor)
+                    if repeated:
+                        items: List[Any] = []
+                        for pos, item in enumerate(val):
+                            items.append(None)
+                            if is_default is None or not is_default(item):
+                                stack.append((sub_plan, item, items, pos, depth + 1))
+                        val = items
+                    elif is_default is not None and is_default(val):
+                        continue
+                    else:
+                        task = (sub_plan, val)
+
+                if pivot is not None and number > pivot:
+                    key: Any = str(number)
+                    slot = extension
+                    extension[key] = val
+                else:
+                    if number - 1 > len(result):
+                        result += (None,) * (number - 1 - len(result))
+                    key, slot = len(result), result
+                    result.append(val)
+                if task is not None:
+                    stack.append((*task, slot, key, depth + 1))
+            if extension:
+                result.append(extension)
+            target[index] = result
+        return root[0]
+
+
+class DecodePlan:
+    __slots__ = (
+        "descriptor",
+        "fields",
+        "slots",
+        "nested",
+        "positions",
+        "defaults",
+        "messages",
+        "decode",
+    )
+
+    def __init__(self, descriptor: Descriptor) -> None:
+        self.descriptor = descriptor
+        # field and value setter by array position, unknown numbers are missing
+        self.fields: Dict[int, FieldDescriptor] = {}
+        self.slots: Dict[int, Callable[[Message, Any], None]] = {}
+        # (attribute name, descriptor, repeated) for sub-message positions
+        self.nested: Dict[int, Tuple[str, Descriptor, bool]] = {}
+        # typed nullable defaults and sub-messages used for None-type messages
+        self.defaults: List[Tuple[FieldDescriptor, Any]] = []
+        self.messages: List[Tuple[str, Descriptor]] = []
+
+        for schema in message_schema(descriptor).values():
+            field = schema.field
+            pos = field.number - 1
+            self.fields[pos] = field
+            self.slots[pos] = _field_decoder(schema)
+
+            if field.type == field.TYPE_MESSAGE:
+                repeated = field.label == field.LABEL_REPEATED
+                self.nested[pos] = (field.name, field.message_type, repeated)
+                if not repeated:
+                    self.messages.append((field.name, field.message_type))
+            elif schema.default is not None:
+                self.defaults.append(schema.default)
+
+        # known positions, compact arrays decode trimmed ones as None
+        self.positions = sorted(self.fields)
+
+        generated = generated_functions(descriptor)
+        self.decode: Callable[[List[Any], Message], Message] = (
+            self.run if generated is None else generated[1]
+        )
+
+    def run(
+        self,
+        arr: List[Any],
+        msg: Message,
+        max_depth: Optional[int] = None,
+        compact: bool = False,
+    ) -> Message:
+        # sub-messages are filled in place from an explicit work stack
+        stack = [(self, arr, msg, 0)]
+        while stack:
+            plan, arr, model, depth = stack.pop()
+            if max_depth is not None and depth > max_depth:
+                raise ValueError(f"Message nesting exceeds max_depth={max_depth}")
+
+            slots, nested = plan.slots, plan.nested
+            items = plan.compact_items(arr) if compact else enumerate(arr)
+            for idx, item in items:
+                setter = slots.get(idx)
+                if setter is None:
+                    if item is None:  # padding for numbers missing in the schema
+                        continue
+                    raise KeyError(idx + 1)
+                sub = nested.get(idx)
+                if sub is None or item is None:
+                    setter(model, item)
+                    continue
+
+                name, descriptor, repeated = sub
+                sub_plan = decode_plan(descriptor)
+                if repeated:
+                    container = getattr(model, name)
+                    for sub_item in item:
+                        sub_model = container.add()
+                        if sub_item is None:
+                            sub_plan.fill_defaults(sub_model)
+                        else:
+                            stack.append((sub_plan, sub_item, sub_model, depth + 1))
+                else:
+                    stack.append((sub_plan, item, getattr(model, name), depth + 1))
+        return msg
+
+    def compact_items(self, arr: List[Any]) -> List[Tuple[int, Any]]:
+        # positions from a trailing {"<number>": value} object, and None for
+        # trimmed positions so they decode like an explicit null
+        extension = arr[-1] if arr and isinstance(arr[-1], dict) else None
+        size = len(arr) if extension is None else len(arr) - 1
+        items = list(islice(enumerate(arr), size))
+        if extension:
+            for key, item in extension.items():
+                if int(key) < 1:
+                    raise KeyError(key)
+                items.append((int(key) - 1, item))
+        for idx in islice(self.positions, bisect_left(self.positions, size), None):
+            if extension is None or str(idx + 1) not in extension:
+                items.append((idx, None))
+        return items
+
+    def fill_defaults(self, msg: Message, active: frozenset = frozenset()) -> None:
+        # None-type is Message with default values
+        for field, value in self.defaults:
+            _assign_field_value(msg, field, value)
+        active = active | {self.descriptor}
+        for name, sub_descriptor in self.messages:
+            model = getattr(msg, name)
+            model.SetInParent()
+            if sub_descriptor not in active:  # stop at self-referential types
+                decode_plan(sub_descriptor).fill_defaults(model, active)
+
+
+@plan_cache
+def encode_plan(descriptor: Descriptor) -> EncodePlan:
+    return EncodePlan(descriptor)
+
+
+@plan_cache
+def decode_plan(descriptor: Descriptor) -> DecodePlan:
+    return DecodePlan(descriptor)
+
+
+def install_generated(
+    functions: Dict[Descriptor, Tuple[Callable, Callable]],
+    schema: Optional[str] = None,
+) -> None:
+    if schema is not None and schema != schema_hash(functions):
+        names = ", ".join(descriptor.full_name for descriptor in functions)
+        logging.warning(
+            "Generated code for %s is out of date with the schema and is not "
+            "used, regenerate it with protobuf2arr.codegen",
+            names,
+        )
+        return
+    GENERATED.update(functions)
+    # modules missing on an earlier lookup may be importable now
+    _import_generated.cache_clear()
+    clear_plans()
+
+
+def schema_hash(descriptors: Iterable[Descriptor]) -> str:
+    # everything generated code inlines: field layout, types and nullable values
+    digest = hashlib.sha256()
+    for descriptor in descriptors:
+        digest.update(descriptor.full_name.encode("UTF-8"))
+        for field in descriptor.fields:
+            enum_values = None
+            if field.enum_type is not None:
+                enum_values = [
+                    (item.name, item.number) for item in field.enum_type.values
+                ]
+            message_name = None
+            if field.message_type is not None:
+                message_name = field.message_type.full_name
+            row = (
+                field.number,
+                field.name,
+                field.type,
+                field.label,
+                message_name,
+                enum_values,
+                nullable_values(field),
+            )
+            digest.update(repr(row).encode("UTF-8"))
+    return digest.hexdigest()
+
+
+def generated_functions(descriptor: Descriptor) -> Optional[Tuple[Callable, Callable]]:
+    if descriptor not in GENERATED:
+        # classes built by message_factory have no module
+        module_name = getattr(descriptor._concrete_class, "__module__", None)
+        _import_generated(module_name or "")
+    return GENERATED.get(descriptor)
+
+
+@lru_cache(maxsize=None)
+def _import_generated(module_name: str) -> None:
+    # ahead-of-time generated taskqueue_arr.py sits next to taskqueue_pb2.py and
+    # registers its functions on import
+    if module_name.endswith(PB2_SUFFIX):
+        name = module_name[: -len(PB2_SUFFIX)] + ARR_SUFFIX
+        try:
+            if importlib.util.find_spec(name) is not None:
+                importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def precompile(message_cls: Type[Message]) -> None:
+    pending, seen = [message_cls.DESCRIPTOR], set()
+    while pending:
+        descriptor = pending.pop()
+        if descriptor in seen:
+            continue
+        seen.add(descriptor)
+        encode_plan(descriptor)
+        decode_plan(descriptor)
+        pending.extend(
+            field.message_type
+            for field in descriptor.fields
+            if field.type == field.TYPE_MESSAGE
+        )
+
+
+def nullable_prototypes(descriptor: Descriptor, defaults: Iterable[str]) -> List[list]:
+    # Parse each nullable text-format value into a prototype once. Only values
+    # in canonical form can equal str(item).strip(), so others never match.
+    prototypes: List[List[Any]] = []
+    for value in defaults:
+        if not value:  # the usual '' needs no parsing
+            prototypes.append([])
+            continue
+        prototype = descriptor._concrete_class()
+        try:
+            text_format.Parse(value, prototype)
+        except text_format.ParseError:
+            continue
+        if str(prototype).strip() == value:
+            prototypes.append(prototype.ListFields())
+    return prototypes
+
+
+def nullable_matcher(
+    descriptor: Descriptor, defaults: Iterable[str]
+) -> Optional[Callable[[Message], bool]]:
+    return _prototype_matcher(nullable_prototypes(descriptor, defaults))
+
+
+def _prototype_matcher(
+    prototypes: List[list],
+) -> Optional[Callable[[Message], bool]]:
+    if not prototypes:
+        return None
+    if prototypes == [[]]:
+        return lambda item: not item.ListFields()
+    return lambda item: item.ListFields() in prototypes
+
+
+def _field_encoder(schema: FieldSchema) -> Optional[Callable[[Any], Any]]:
+    field = schema.field
+    defaults = frozenset(schema.nullable)
+    if field.label == field.LABEL_REPEATED:
+        if defaults:
+            return lambda val: None if str(val) in defaults else list(val)
+        return list
+
+    if not defaults:
+        return None
+    if field.type == field.TYPE_BYTES:
+        return lambda val: (
+            None if str(val, "UTF-8") in defaults or str(val) in defaults else val
+        )
+    return lambda val: None if str(val) in defaults else val
+
+
+def _field_decoder(schema: FieldSchema) -> Callable[[Message, Any], None]:
+    field = schema.field
+    name = field.name
+
+    if field.type == field.TYPE_MESSAGE:
+        sub_descriptor = field.message_type
+
+        def decode_item(item: Optional[List[Any]], model: Message) -> None:
+            plan = decode_plan(sub_descriptor)
+            if item is None:
+                model.SetInParent()
+                plan.fill_defaults(model)
+            else:
+                plan.decode(item, model)
+
+        if field.label == field.LABEL_REPEATED:
+
+            def decode_repeated(msg: Message, item: List[Any]) -> None:
+                # filled in place, extend() would copy every sub-message
+                container = getattr(msg, name)
+                for sub_item in item or ():
+                    decode_item(sub_item, container.add())
+
+            return decode_repeated
+        return lambda msg, item: decode_item(item, getattr(msg, name))
+
+    default = schema.default
+    is_bytes = field.type == field.TYPE_BYTES
+
+    def decode_value(msg: Message, item: Any) -> None:
+        if item is None:
+            if default is not None:
+                _assign_field_value(msg, field, default[1])
+        elif is_bytes and isinstance(item, str):
+            _assign_field_value(msg, field, item.encode("UTF-8"))
+        else:
+            _assign_field_value(msg, field, item)
+
+    return decode_value
+
+
+def _typed_default(field: FieldDescriptor) -> Optional[Tuple[FieldDescriptor, Any]]:
+    return field_schema(field).default
+
+
+def _bundled_default(
+    field_type: int, label: int, name: str, nullable: List[str]
+) -> Optional[Tuple[Any]]:
+    if field_type == FieldDescriptor.TYPE_MESSAGE:
+        return None
+    for value in nullable:
+        if value is not None:
+            return (_str_to_type(field_type, label, name, value),)
+    return None
+
+
+def _assign_field_value(msg: Message, field: FieldDescriptor, value: Any) -> None:
+    if field.label == field.LABEL_REPEATED and isinstance(value, list):
+        ls = getattr(msg, field.name)
+        ls.extend(value)
+    else:
+        setattr(msg, field.name, value)
+
+
+def _str_to_type(field_type: int, label: int, name: str, value: str) -> Any:
+    field = FieldDescriptor
+    value_arr: List[Any] = None
+    if label == field.LABEL_REPEATED:
+        try:
+            value_arr = json.loads(value)
+        except:
+            logging.warn("Invalid default value for repeated field: " + name)
+
+    if field_type == field.TYPE_STRING:
+        return value if value_arr is None else value_arr
+    elif field_type == field.TYPE_BOOL:
+        return value.lower() in ["true", "1", "yes"] if value_arr is None else value_arr
+    elif field_type == field.TYPE_BYTES:
+        return value.encode("UTF-8") if value_arr is None else value_arr
+    elif field_type == field.TYPE_ENUM:
+        return int(value) if value_arr is None else value_arr
+    elif field_type == field.TYPE_DOUBLE or field_type == field.TYPE_FLOAT:
+        return float(value) if value_arr is None else value_arr
+    elif field_type in [
+        field.TYPE_FIXED32,
+        field.TYPE_FIXED64,
+        field.TYPE_INT32,
+        field.TYPE_INT64,
+        field.TYPE_SFIXED32,
+        field.TYPE_SFIXED64,
+        field.TYPE_SINT32,
+        field.TYPE_SINT64,
+        field.TYPE_UINT32,
+        field.TYPE_UINT64,
+    ]:
+        return int(value) if value_arr is None else value_arr
+    else:
+        return None if value_arr is None else value_arr
@@ -0,0 +1,106 @@
+import codecs
+import simplejson as json
+from typing import IO, Any, Iterable, Iterator, Optional, Union
+
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+DELIMITERS = ",]}:" + WHITESPACE
+
+Source = Union[IO, Iterable[Union[str, bytes]]]
+
+
+class ArrReader:
+    def __init__(self, source: Source, chunk_size: int = CHUNK_SIZE) -> None:
+        self._chunks = _read_chunks(source, chunk_size)
+        self._utf8 = codecs.getincrementaldecoder("UTF-8")()
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def peek(self) -> str:
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._more():
+                return ""
+
+    def consume(self, char: str) -> None:
+        if self.peek() != char:
+            self._error(f"Expecting '{char}'")
+        self._pos += 1
+
+    def value(self) -> Any:
+        if not self.peek():
+            self._error("Expecting value")
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            else:
+                # a number cut at a chunk boundary decodes as a shorter number,
+                # accept values only once their delimiter has arrived
+                buf = self._buf
+                if self._eof or (end < len(buf) and buf[end] in DELIMITERS):
+                    self._pos = end
+                    return obj
+            self._grow()
+
+    def end(self) -> None:
+        if self.peek():
+            self._error("Extra data")
+
+    def _more(self) -> bool:
+        chunk = self._read()
+        if chunk is None:
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _grow(self) -> None:
+        # double the pending text so values spanning many chunks parse in linear
+        # time, the chunks are joined once per round rather than one at a time
+        parts = [self._buf[self._pos :]]
+        size = len(parts[0])
+        target = 2 * size + 1
+        while size < target:
+            chunk = self._read()
+            if chunk is None:
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        self._buf = "".join(parts)
+        self._pos = 0
+
+    def _read(self) -> Optional[str]:
+        # next non-empty chunk of text, None at the end of the input
+        if self._eof:
+            return None
+        for chunk in self._chunks:
+            if isinstance(chunk, bytes):
+                chunk = self._utf8.decode(chunk)
+            if chunk:
+                return chunk
+        self._eof = True
+        # raises on a multibyte character cut off at the end of the input
+        self._utf8.decode(b"", final=True)
+        return None
+
+    def _error(self, msg: str) -> None:
+        raise json.JSONDecodeError(msg, self._buf, self._pos)
+
+
+def _read_chunks(source: Source, chunk_size: int) -> Iterator[Union[str, bytes]]:
+    if hasattr(source, "read"):
+        while chunk := source.read(chunk_size):
+            yield chunk
+    else:
+        yield from source
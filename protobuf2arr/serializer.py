@@ -1,146 +1,340 @@
-import logging
+import io
 import simplejson as json
-from typing import Any, List
-from google.protobuf.message import Message
+from time import perf_counter
+from typing import IO, Any, Iterator, List, Optional, Union
 from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.message import Message
+
+from . import instrument
+from .backends import JsonBackend, get_backend
+from .plan import NULLABLE_KEY, DecodePlan, EncodePlan, decode_plan, encode_plan
+from .reader import ArrReader, Source
+from .subtree import FRAGMENT, SubtreeCache
+
+
+CHUNK_SIZE = 64 * 1024
+
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def msg_to_arr(
+    obj: Message,
+    max_depth: Optional[int] = None,
+    compact: bool = False,
+    pivot: Optional[int] = None,
+    cache: Optional[SubtreeCache] = None,
+) -> List[Any]:
+    start = perf_counter() if instrument.enabled else 0.0
+    plan = encode_plan(obj.DESCRIPTOR)
+    full = not compact and pivot is None
+    if not full:
+        if cache is not None:
+            raise ValueError("Sub-tree caching is not supported for compact encoding")
+        arr = plan.run_compact(obj, pivot, max_depth)
+    elif max_depth is None and cache is None:
+        arr = plan.encode(obj)
+    else:
+        arr = plan.run(obj, max_depth, cache)
+    if start and instrument.enabled:
+        instrument.observe(
+            "msg_to_arr", obj.DESCRIPTOR, start, arr=arr if full else None
+        )
+    return arr
+
+
+def arr_to_msg(
+    arr: List[Any],
+    msg: Message,
+    max_depth: Optional[int] = None,
+    compact: bool = False,
+    reuse: bool = False,
+) -> Message:
+    start = perf_counter() if instrument.enabled else 0.0
+    if reuse:  # refill a pooled message instead of merging into it
+        msg.Clear()
+    plan = decode_plan(msg.DESCRIPTOR)
+    if max_depth is None and not compact:
+        plan.decode(arr, msg)
+    else:
+        plan.run(arr, msg, max_depth, compact)
+    if start and instrument.enabled:
+        instrument.observe("arr_to_msg", msg.DESCRIPTOR, start)
+    return msg
+
+
+def serialize_msg2arr(
+    message: Message,
+    max_depth: Optional[int] = None,
+    backend: Union[str, JsonBackend, None] = None,
+    compact: bool = False,
+    pivot: Optional[int] = None,
+    cache: Optional[SubtreeCache] = None,
+) -> str:
+    start = perf_counter() if instrument.enabled else 0.0
+    arr = msg_to_arr(message, max_depth, compact, pivot, cache)
+    arr_str = get_backend(backend).dumps(arr)
+    if start and instrument.enabled:
+        instrument.observe("serialize_msg2arr", message.DESCRIPTOR, start, len(arr_str))
+    return arr_str
+
+
+def serialize_msg2arr_bytes(
+    message: Message,
+    max_depth: Optional[int] = None,
+    backend: Union[str, JsonBackend, None] = None,
+    compact: bool = False,
+    pivot: Optional[int] = None,
+    cache: Optional[SubtreeCache] = None,
+) -> bytes:
+    start = perf_counter() if instrument.enabled else 0.0
+    arr = msg_to_arr(message, max_depth, compact, pivot, cache)
+    data = get_backend(backend).dumps_bytes(arr)
+    if start and instrument.enabled:
+        instrument.observe("serialize_msg2arr", message.DESCRIPTOR, start, len(data))
+    return data
+
 
+def deserialize_arr2msg(
+    arr_str: str,
+    message: Message,
+    max_depth: Optional[int] = None,
+    backend: Union[str, JsonBackend, None] = None,
+    compact: bool = False,
+    reuse: bool = False,
+) -> Message:
+    start = perf_counter() if instrument.enabled else 0.0
+    arr = get_backend(backend).loads(arr_str)
+    arr_to_msg(arr, message, max_depth, compact, reuse)
+    if start and instrument.enabled:
+        instrument.observe(
+            "deserialize_arr2msg", message.DESCRIPTOR, start, len(arr_str)
+        )
+    return message
 
-NULLABLE_KEY = "nullable"
 
+def deserialize_arr2msg_bytes(
+    data: bytes,
+    message: Message,
+    max_depth: Optional[int] = None,
+    backend: Union[str, JsonBackend, None] = None,
+    compact: bool = False,
+    reuse: bool = False,
+) -> Message:
+    start = perf_counter() if instrument.enabled else 0.0
+    arr = get_backend(backend).loads(data)
+    arr_to_msg(arr, message, max_depth, compact, reuse)
+    if start and instrument.enabled:
+        instrument.observe("deserialize_arr2msg", message.DESCRIPTOR, start, len(data))
+    return message
 
-def msg_to_arr(obj: Message) -> List[Any]:
-    result: List[Any] = []
-    for field in obj.DESCRIPTOR.fields:
-        val, pos = getattr(obj, field.name), field.number - 1
-        while pos > len(result):
-            # fill array for not implemented message properties
-            result.append(None)
 
-        default_values: str = []
-        if options := field.GetOptions():
-            default_values = [
-                options.Extensions[ext]
-                for ext in options.Extensions
-                if ext.name == NULLABLE_KEY
-            ]
+def deserialize_arr2msg_from(
+    source: Source,
+    message: Message,
+    chunk_size: int = CHUNK_SIZE,
+    reuse: bool = False,
+    max_depth: Optional[int] = None,
+) -> Message:
+    if reuse:
+        message.Clear()
+    reader = ArrReader(source, chunk_size)
+    _read_msg(reader, decode_plan(message.DESCRIPTOR), message, max_depth)
+    reader.end()
+    return message
 
-        if field.type == field.TYPE_MESSAGE:
-            if field.label == field.LABEL_REPEATED:
-                list_vals: List[Any] = []
-                for item in val:
-                    if default_values and str(item).strip() in default_values:
-                        list_vals.append(None)
+
+def iter_serialize_msg2arr(
+    message: Message,
+    chunk_size: int = CHUNK_SIZE,
+    encoding: str = None,
+    cache: Optional[SubtreeCache] = None,
+) -> Iterator[Union[str, bytes]]:
+    parts: List[str] = []
+    size = 0
+    for fragment in _iter_msg(encode_plan(message.DESCRIPTOR), message, cache):
+        parts.append(fragment)
+        size += len(fragment)
+        if size >= chunk_size:
+            chunk = "".join(parts)
+            yield chunk if encoding is None else chunk.encode(encoding)
+            parts, size = [], 0
+    if parts:
+        chunk = "".join(parts)
+        yield chunk if encoding is None else chunk.encode(encoding)
+
+
+def serialize_msg2arr_to(
+    message: Message,
+    fp: IO,
+    chunk_size: int = CHUNK_SIZE,
+    cache: Optional[SubtreeCache] = None,
+) -> None:
+    encoding = None if isinstance(fp, io.TextIOBase) else "UTF-8"
+    for chunk in iter_serialize_msg2arr(message, chunk_size, encoding, cache):
+        fp.write(chunk)
+
+
+def _iter_msg(
+    plan: EncodePlan, obj: Message, cache: Optional[SubtreeCache] = None
+) -> Iterator[str]:
+    # open messages are [plan, message, next step, items of the repeated field
+    # being written, its (descriptor, repeated, nullable matcher), cache key,
+    # start in parts] frames on an explicit stack, resumed after each
+    # sub-message, so memory grows with neither nesting depth nor item count
+    encode = _encoder.encode
+    parts = ["["]
+    # cached sub-trees are written whole instead of streamed
+    building = 0
+    stack: List[list] = [[plan, obj, 0, None, None, None, 0]]
+    while stack:
+        frame = stack[-1]
+        steps = frame[0].steps
+        child = None
+        while child is None:
+            items = frame[3]
+            if items is not None:
+                descriptor, _, is_default = frame[4]
+                for pos, item in items:
+                    if pos:
+                        parts.append(",")
+                    if is_default is not None and is_default(item):
+                        parts.append("null")
                     else:
-                        list_vals.append(msg_to_arr(item))
-                val = list_vals
-            else:
-                if default_values and str(val).strip() in default_values:
-                    val = None
+                        child = (descriptor, item)
+                        break
                 else:
-                    val = msg_to_arr(val)
-        elif default_values:
-            if field.type == field.TYPE_BYTES and str(val, "UTF-8") in default_values:
-                val = None
-            elif str(val) in default_values:
-                val = None
-        if field.label == field.LABEL_REPEATED and val != None:
-            val = [item for item in val]
-        result.append(val)
-    return result
-
-
-def arr_to_msg(arr: List[Any], msg: Message) -> Message:
-    for idx, item in enumerate(arr):
-        num = idx + 1
-        field = msg.DESCRIPTOR.fields_by_number[num]
-        if field.type == field.TYPE_MESSAGE:
-            cls = field.message_type._concrete_class
-            if field.label == field.LABEL_REPEATED:
-                models = []
-                for sub_item in item:
-                    # None-type is Message with default values
-                    value = (
-                        [None for _ in cls.DESCRIPTOR.fields]
-                        if sub_item is None
-                        else sub_item
-                    )
-                    model = cls()
-                    arr_to_msg(value, model)  # fill model
-                    models.append(model)
-                _assign_field_value(msg, field, models)
+                    parts.append("]")
+                    frame[3] = None
+                continue
+
+            idx = frame[2]
+            if idx == len(steps):
+                break
+            frame[2] = idx + 1
+            name, padding, handler, sub = steps[idx]
+            sep = "," if idx else ""
+            if padding:
+                parts.append(sep + ",".join(["null"] * len(padding)))
+                sep = ","
+            val = getattr(frame[1], name)
+            if sub is None:
+                parts.append(sep + encode(val if handler is None else handler(val)))
+                continue
+            descriptor, repeated, is_default = sub
+            if repeated:
+                parts.append(sep + "[")
+                frame[3], frame[4] = enumerate(val), sub
+            elif is_default is not None and is_default(val):
+                parts.append(sep + "null")
             else:
-                # None-type is Message with default values
-                value = [None for _ in cls.DESCRIPTOR.fields] if item is None else item
-                model = getattr(msg, field.name)
-                arr_to_msg(value, model)  # fill model
-        elif field.type == field.TYPE_BYTES and isinstance(item, str):
-            _assign_field_value(msg, field, item.encode("UTF-8"))
-        elif item == None and (options := field.GetOptions()):
-            default_str_value = next(
-                filter(
-                    lambda v: v is not None,
-                    [
-                        options.Extensions[ext]
-                        for ext in options.Extensions
-                        if ext.name == NULLABLE_KEY
-                    ],
-                )
-            )
-            typed_value = _str_to_type(field, default_str_value)
-            _assign_field_value(msg, field, typed_value)
-        else:
-            _assign_field_value(msg, field, item)
-    return msg
+                parts.append(sep)
+                child = (descriptor, val)
 
+        if child is None:  # end of the message
+            parts.append("]")
+            stack.pop()
+            key, start = frame[5], frame[6]
+            if key is not None:
+                parts[start:] = ["".join(parts[start:])]
+                cache.put(key, parts[start])
+                building -= 1
+            continue
+
+        descriptor, obj = child
+        key = None if cache is None else cache.key(FRAGMENT, obj)
+        if key is not None:
+            fragment = cache.get(key)
+            if fragment is not None:
+                parts.append(fragment)
+                continue
+        if not building:
+            yield "".join(parts)
+            parts = []
+        if key is not None:
+            building += 1
+        stack.append([encode_plan(descriptor), obj, 0, None, None, key, len(parts)])
+        parts.append("[")
+    yield "".join(parts)
 
-def _assign_field_value(msg: Message, field: FieldDescriptor, value: Any) -> None:
-    if field.label == field.LABEL_REPEATED and isinstance(value, list):
-        ls = getattr(msg, field.name)
-        ls.extend(value)
-    else:
-        setattr(msg, field.name, value)
-
-
-def _str_to_type(field: FieldDescriptor, value: str) -> Any:
-    value_arr: List[Any] = None
-    if field.label == field.LABEL_REPEATED:
-        try:
-            value_arr = json.loads(value)
-        except:
-            logging.warn("Invalid default value for repeated field: " + field.name)
-
-    if field.type == field.TYPE_STRING:
-        return value if value_arr is None else value_arr
-    elif field.type == field.TYPE_BOOL:
-        return value.lower() in ["true", "1", "yes"] if value_arr is None else value_arr
-    elif field.type == field.TYPE_BYTES:
-        return value.encode("UTF-8") if value_arr is None else value_arr
-    elif field.type == field.TYPE_ENUM:
-        return int(value) if value_arr is None else value_arr
-    elif field.type == field.TYPE_DOUBLE or field.type == field.TYPE_FLOAT:
-        return float(value) if value_arr is None else value_arr
-    elif field.type in [
-        field.TYPE_FIXED32,
-        field.TYPE_FIXED64,
-        field.TYPE_INT32,
-        field.TYPE_INT64,
-        field.TYPE_SFIXED32,
-        field.TYPE_SFIXED64,
-        field.TYPE_SINT32,
-        field.TYPE_SINT64,
-        field.TYPE_UINT32,
-        field.TYPE_UINT64,
-    ]:
-        return int(value) if value_arr is None else value_arr
-    else:
-        return None if value_arr is None else value_arr
 
+def _read_msg(
+    reader: ArrReader,
+    plan: DecodePlan,
+    msg: Message,
+    max_depth: Optional[int] = None,
+) -> None:
+    # mirrors DecodePlan.run, but sub-messages and repeated values are filled
+    # as they are read so no intermediate list tree is kept; the open arrays
+    # are [plan, message or container, repeated message field, index, depth]
+    # frames on an explicit stack
+    stack: List[list] = []
+    _open(reader, stack, plan, msg, None, 0, max_depth)
+    while stack:
+        frame = stack[-1]
+        plan, target, repeated, idx, depth = frame
+        if idx >= 0:
+            if reader.peek() == "]":
+                reader.consume("]")
+                stack.pop()
+                continue
+            reader.consume(",")
+        idx = frame[3] = idx + 1
+
+        if repeated is not None:  # items of a repeated message field
+            if reader.peek() == "[":
+                _open(reader, stack, plan, target.add(), None, depth, max_depth)
+            elif reader.value() is None:
+                plan.fill_defaults(target.add())
+            else:
+                raise ValueError(f"Expected an array for {repeated.full_name}")
+            continue
 
-def serialize_msg2arr(message: Message) -> str:
-    arr = msg_to_arr(message)
-    return json.dumps(arr, separators=(",", ":"))
+        field = plan.fields.get(idx)
+        if field is None:
+            if reader.value() is not None:
+                raise KeyError(idx + 1)
+        elif reader.peek() != "[":
+            plan.slots[idx](target, reader.value())
+        elif field.type == field.TYPE_MESSAGE:
+            sub_plan = decode_plan(field.message_type)
+            sub = getattr(target, field.name)
+            # items of a repeated field are one level down, like the message
+            repeated = field if field.label == field.LABEL_REPEATED else None
+            _open(reader, stack, sub_plan, sub, repeated, depth + 1, max_depth)
+        elif field.label == field.LABEL_REPEATED:
+            container = getattr(target, field.name)
+            for _ in _read_items(reader):
+                container.append(reader.value())
+        else:
+            plan.slots[idx](target, reader.value())
+
+
+def _open(
+    reader: ArrReader,
+    stack: List[list],
+    plan: DecodePlan,
+    target: Any,
+    repeated: Optional[FieldDescriptor],
+    depth: int,
+    max_depth: Optional[int],
+) -> None:
+    if repeated is None and max_depth is not None and depth > max_depth:
+        raise ValueError(f"Message nesting exceeds max_depth={max_depth}")
+    reader.consume("[")
+    if reader.peek() == "]":
+        reader.consume("]")
+    else:
+        stack.append([plan, target, repeated, -1, depth])
 
 
-def deserialize_arr2msg(arr_str: str, message: Message) -> Message:
-    arr = json.loads(arr_str)
-    return arr_to_msg(arr, message)
+def _read_items(reader: ArrReader) -> Iterator[None]:
+    reader.consume("[")
+    if reader.peek() == "]":
+        reader.consume("]")
+        return
+    while True:
+        yield
+        if reader.peek() == "]":
+            reader.consume("]")
+            return
+        reader.consume(",")
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+from google.protobuf.descriptor import Descriptor
+from google.protobuf.message import Message
+
+
+DEFAULT_MAXSIZE = 1024
+
+# value kinds sharing one cache
+ARRAY = 0
+FRAGMENT = 1
+
+Key = Tuple[int, str, Hashable]
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class SubtreeCache:
+    def __init__(
+        self,
+        fingerprint: Callable[[Message], Hashable],
+        maxsize: int = DEFAULT_MAXSIZE,
+        messages: Optional[Iterable[Union[Type[Message], Descriptor]]] = None,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be positive, got {maxsize}")
+        self.maxsize = maxsize
+        # sub-message types to cache, None for all of them
+        self.messages: Optional[Set[str]] = None
+        if messages is not None:
+            self.messages = {
+                getattr(message, "DESCRIPTOR", message).full_name
+                for message in messages
+            }
+        # called once per sub-message, it has to be cheaper than encoding it
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Key, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, kind: int, obj: Message) -> Optional[Key]:
+        # None for message types that are not cached
+        full_name = obj.DESCRIPTOR.full_name
+        if self.messages is not None and full_name not in self.messages:
+            return None
+        return kind, full_name, self.fingerprint(obj)
+
+    def get(self, key: Key, pending: Optional[Dict[Key, Any]] = None) -> Any:
+        # pending holds the sub-trees the caller is still building
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            elif pending is not None:
+                value = pending.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: Key, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+def serialized(obj: Message) -> bytes:
+    # equal sub-trees serialize to equal bytes, but a miss on a parent
+    # serializes its children again, best limited to leaf types via messages=
+    return obj.SerializeToString(deterministic=True)
@@ -0,0 +1,470 @@
+import struct
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.internal import encoder, type_checkers, wire_format
+from google.protobuf.message import DecodeError
+
+from .plan import FieldSchema, _field_encoder, message_schema, plan_cache
+
+
+F = FieldDescriptor
+
+VARINT = wire_format.WIRETYPE_VARINT
+FIXED64 = wire_format.WIRETYPE_FIXED64
+LENGTH = wire_format.WIRETYPE_LENGTH_DELIMITED
+START_GROUP = wire_format.WIRETYPE_START_GROUP
+END_GROUP = wire_format.WIRETYPE_END_GROUP
+FIXED32 = wire_format.WIRETYPE_FIXED32
+
+# sub-message nullable matchers, decided on the wire where possible
+MATCH_NONE, MATCH_EMPTY, MATCH_MESSAGE = range(3)
+
+
+def binary_to_arr(
+    data: bytes, descriptor: Descriptor, max_depth: Optional[int] = None
+) -> List[Any]:
+    return _to_arr(memoryview(data), wire_plan(descriptor), max_depth)
+
+
+def arr_to_binary(
+    arr: List[Any], descriptor: Descriptor, max_depth: Optional[int] = None
+) -> bytes:
+    return _to_binary(arr, wire_plan(descriptor), max_depth)
+
+
+class WireField:
+    __slots__ = (
+        "field",
+        "number",
+        "repeated",
+        "message",
+        "wire_type",
+        "packable",
+        "implicit",
+        "oneof",
+        "read",
+        "write",
+        "check",
+        "handler",
+        "default",
+        "match",
+        "matcher",
+    )
+
+    def __init__(self, schema: FieldSchema) -> None:
+        field = schema.field
+        self.field = field
+        self.number = field.number
+        self.repeated = field.label == field.LABEL_REPEATED
+        self.message = field.type == field.TYPE_MESSAGE
+        self.wire_type = type_checkers.FIELD_TYPE_TO_WIRE_TYPE[field.type]
+        self.packable = self.repeated and wire_format.IsTypePackable(field.type)
+        # proto3 scalars without presence are cleared when set to their default
+        self.implicit = not self.repeated and not field.has_presence
+        # other members of the same oneof, cleared when this one is set
+        self.oneof: Tuple[int, ...] = ()
+        if field.containing_oneof is not None:
+            self.oneof = tuple(
+                other.number
+                for other in field.containing_oneof.fields
+                if other is not field
+            )
+
+        self.read = _READERS.get(field.type)
+        self.write: Optional[Callable] = None
+        self.check: Optional[Callable] = None
+        self.match = MATCH_NONE
+        self.matcher = None
+        if self.message:
+            self.matcher = schema.matcher
+            if self.matcher is not None:
+                self.match = MATCH_EMPTY if schema.empty else MATCH_MESSAGE
+        else:
+            self.write = type_checkers.TYPE_TO_ENCODER[field.type](
+                field.number, self.repeated, _is_packed(field)
+            )
+            self.check = type_checkers.GetTypeChecker(field).CheckValue
+        self.handler = None if self.message else _field_encoder(schema)
+        self.default = schema.default
+
+
+class WirePlan:
+    __slots__ = ("descriptor", "fields", "steps", "positions", "ordered")
+
+    def __init__(self, descriptor: Descriptor) -> None:
+        self.descriptor = descriptor
+        self.fields: Dict[int, WireField] = {}
+        # (padding to append before the value, field) in msg_to_arr order
+        self.steps: List[Tuple[Tuple[None, ...], WireField]] = []
+        # field by array position as in arr_to_msg, unknown numbers are missing
+        self.positions: Dict[int, WireField] = {}
+
+        length = 0
+        for schema in message_schema(descriptor).values():
+            field = schema.field
+            info = self.fields[field.number] = WireField(schema)
+            pos = field.number - 1
+            self.steps.append(((None,) * max(pos - length, 0), info))
+            length = max(pos, length) + 1
+            self.positions[pos] = info
+        # serialized in field number order, like Message.SerializeToString
+        self.ordered = [self.fields[number] for number in sorted(self.fields)]
+
+
+@plan_cache
+def wire_plan(descriptor: Descriptor) -> WirePlan:
+    return WirePlan(descriptor)
+
+
+def _to_arr(buf: memoryview, plan: WirePlan, max_depth: Optional[int]) -> List[Any]:
+    # sub-messages go on an explicit work stack and are written into the slot
+    # reserved for them, as in EncodePlan.run
+    root: List[Any] = [None]
+    stack = [(buf, plan, root, 0, 0)]
+    while stack:
+        buf, plan, target, index, depth = stack.pop()
+        if max_depth is not None and depth > max_depth:
+            raise ValueError(f"Message nesting exceeds max_depth={max_depth}")
+
+        values = _parse(buf, plan)
+        result: List[Any] = []
+        for padding, info in plan.steps:
+            if padding:
+                result += padding
+            if not info.message:
+                if info.repeated:
+                    val = values.get(info.number, [])
+                else:
+                    val = values.get(info.number, info.field.default_value)
+                result.append(val if info.handler is None else info.handler(val))
+                continue
+
+            sub_plan = wire_plan(info.field.message_type)
+            chunks = values.get(info.number, ())
+            if info.repeated:
+                items: List[Any] = []
+                for chunk in chunks:
+                    items.append(None)
+                    if not _is_null(chunk, info, sub_plan):
+                        stack.append(
+                            (chunk, sub_plan, items, len(items) - 1, depth + 1)
+                        )
+                result.append(items)
+            else:
+                # repeated occurrences of a singular message are merged
+                chunk = chunks[0] if len(chunks) == 1 else memoryview(b"".join(chunks))
+                result.append(None)
+                if not _is_null(chunk, info, sub_plan):
+                    stack.append((chunk, sub_plan, result, len(result) - 1, depth + 1))
+        target[index] = result
+    return root[0]
+
+
+def _is_null(buf: memoryview, info: WireField, plan: WirePlan) -> bool:
+    if info.match == MATCH_EMPTY:
+        return _is_empty(buf, plan)
+    if info.match == MATCH_MESSAGE:
+        # prototypes with values are compared on a parsed message
+        cls = info.field.message_type._concrete_class
+        return info.matcher(cls.FromString(buf.tobytes()))
+    return False
+
+
+def _is_empty(buf: memoryview, plan: WirePlan) -> bool:
+    # same as `not msg.ListFields()` on the parsed message
+    for value in _parse(buf, plan).values():
+        if not isinstance(value, list) or value:
+            return False
+    return True
+
+
+def _parse(buf: memoryview, plan: WirePlan) -> Dict[int, Any]:
+    # values by field number: scalars, lists for repeated fields, and lists of
+    # sub-message chunks for message fields
+    values: Dict[int, Any] = {}
+    fields = plan.fields
+    pos, end = 0, len(buf)
+    while pos < end:
+        tag, pos = _read_varint(buf, pos)
+        number, wire_type = tag >> 3, tag & 7
+        info = fields.get(number)
+        if info is None or (
+            wire_type != info.wire_type and not (info.packable and wire_type == LENGTH)
+        ):
+            pos = _skip(buf, pos, wire_type, number)
+            continue
+
+        if info.message:
+            size, pos = _read_varint(buf, pos)
+            values.setdefault(number, []).append(buf[pos : pos + size])
+            pos += size
+        elif info.repeated:
+            items = values.setdefault(number, [])
+            if wire_type == LENGTH and info.wire_type != LENGTH:
+                size, pos = _read_varint(buf, pos)
+                stop = pos + size
+                while pos < stop:
+                    value, pos = info.read(buf, pos)
+                    items.append(value)
+            else:
+                value, pos = info.read(buf, pos)
+                items.append(value)
+        else:
+            value, pos = info.read(buf, pos)
+            if info.implicit and not value:
+                values.pop(number, None)
+            else:
+                values[number] = value
+        for other in info.oneof:
+            values.pop(other, None)
+    if pos > end:
+        raise DecodeError("Truncated message.")
+    return values
+
+
+def _to_binary(arr: List[Any], plan: WirePlan, max_depth: Optional[int]) -> bytes:
+    # each message is a generator suspended on an explicit stack while the
+    # sub-array it yielded is encoded, so nesting depth does not use Python frames
+    stack = [_encode_arr(arr, plan)]
+    result = None
+    while True:
+        try:
+            sub_arr, sub_plan = stack[-1].send(result)
+        except StopIteration as done:
+            stack.pop()
+            if not stack:
+                return done.value[0]
+            result = done.value
+            continue
+        if max_depth is not None and len(stack) > max_depth:
+            raise ValueError(f"Message nesting exceeds max_depth={max_depth}")
+        stack.append(_encode_arr(sub_arr, sub_plan))
+        result = None
+
+
+def _encode_arr(
+    arr: List[Any], plan: WirePlan
+) -> Generator[Tuple[List[Any], WirePlan], Tuple[bytes, bool], Tuple[bytes, bool]]:
+    # returns the payload and whether arr_to_msg would have modified the
+    # message, which decides the presence of singular sub-messages
+    values: Dict[int, Any] = {}
+    modified = False
+    positions = plan.positions
+    for idx, item in enumerate(arr):
+        info = positions.get(idx)
+        if info is None:
+            if item is None:  # padding for numbers missing in the schema
+                continue
+            raise KeyError(idx + 1)
+
+        if info.message:
+            sub_plan = wire_plan(info.field.message_type)
+            if info.repeated:
+                items = values.setdefault(info.number, [])
+                for sub_item in item or ():
+                    if sub_item is None:
+                        items.append(_fill_defaults(sub_plan))
+                    else:
+                        payload = yield sub_item, sub_plan
+                        items.append(payload[0])
+                # container.add() and extend() mark the message as modified
+                modified = modified or item is None or bool(item)
+                continue
+            if item is None:
+                payload, present = _fill_defaults(sub_plan), True
+            else:
+                payload, present = yield item, sub_plan
+            if present:
+                _set(values, info, payload)
+                modified = True
+            continue
+
+        if item is None:
+            if info.default is None:
+                continue
+            item = info.default[1]
+        elif info.field.type == F.TYPE_BYTES and isinstance(item, str):
+            item = item.encode("UTF-8")
+        if info.repeated:
+            if not isinstance(item, list):
+                raise AttributeError(
+                    f'Assignment not allowed to repeated field "{info.field.name}"'
+                )
+            values.setdefault(info.number, []).extend(map(info.check, item))
+        else:
+            _set(values, info, info.check(item))
+        modified = True
+    return _serialize(plan, values), modified
+
+
+def _fill_defaults(plan: WirePlan, active: frozenset = frozenset()) -> bytes:
+    # binary of a None-type message, as DecodePlan.fill_defaults
+    values: Dict[int, Any] = {}
+    active = active | {plan.descriptor}
+    for info in plan.ordered:
+        if info.message:
+            if info.repeated:
+                continue
+            sub_descriptor = info.field.message_type
+            payload = b""
+            if sub_descriptor not in active:  # stop at self-referential types
+                payload = _fill_defaults(wire_plan(sub_descriptor), active)
+            _set(values, info, payload)
+        elif info.default is not None:
+            value = info.default[1]
+            if info.repeated and isinstance(value, list):
+                values[info.number] = [info.check(item) for item in value]
+            else:
+                _set(values, info, info.check(value))
+    return _serialize(plan, values)
+
+
+def _set(values: Dict[int, Any], info: WireField, value: Any) -> None:
+    if info.implicit and not value:
+        values.pop(info.number, None)
+    else:
+        values[info.number] = value
+    for other in info.oneof:
+        values.pop(other, None)
+
+
+def _serialize(plan: WirePlan, values: Dict[int, Any]) -> bytes:
+    out = bytearray()
+    write = out.extend
+    for info in plan.ordered:
+        value = values.get(info.number)
+        if value is None or (info.repeated and not value):
+            continue
+        if not info.message:
+            info.write(write, value, False)
+            continue
+        tag = encoder.TagBytes(info.number, LENGTH)
+        for payload in value if info.repeated else (value,):
+            write(tag)
+            write(encoder._VarintBytes(len(payload)))
+            write(payload)
+    return bytes(out)
+
+
+def _is_packed(field: FieldDescriptor) -> bool:
+    # same rules as the pure python message implementation
+    if field.label != field.LABEL_REPEATED or not wire_format.IsTypePackable(
+        field.type
+    ):
+        return False
+    options = field.GetOptions() if field.has_options else None
+    if field.containing_type.syntax == "proto2":
+        return bool(options and options.packed)
+    return not (options and options.HasField("packed") and not options.packed)
+
+
+def _read_varint(buf: memoryview, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise DecodeError("Truncated message.")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise DecodeError("Too many bytes when decoding varint.")
+
+
+def _skip(buf: memoryview, pos: int, wire_type: int, number: int) -> int:
+    if wire_type == VARINT:
+        return _read_varint(buf, pos)[1]
+    if wire_type == FIXED64:
+        return pos + 8
+    if wire_type == FIXED32:
+        return pos + 4
+    if wire_type == LENGTH:
+        size, pos = _read_varint(buf, pos)
+        return pos + size
+    if wire_type == START_GROUP:
+        while True:
+            tag, pos = _read_varint(buf, pos)
+            if tag & 7 == END_GROUP:
+                if tag >> 3 != number:
+                    raise DecodeError("Mismatched end-group tag.")
+                return pos
+            pos = _skip(buf, pos, tag & 7, tag >> 3)
+    raise DecodeError(f"Unexpected wire type {wire_type}.")
+
+
+def _signed_varint(bits: int) -> Callable[[memoryview, int], Tuple[int, int]]:
+    mask, sign = (1 << bits) - 1, 1 << (bits - 1)
+
+    def read(buf: memoryview, pos: int) -> Tuple[int, int]:
+        value, pos = _read_varint(buf, pos)
+        return ((value & mask) ^ sign) - sign, pos
+
+    return read
+
+
+def _unsigned_varint(bits: int) -> Callable[[memoryview, int], Tuple[int, int]]:
+    mask = (1 << bits) - 1
+
+    def read(buf: memoryview, pos: int) -> Tuple[int, int]:
+        value, pos = _read_varint(buf, pos)
+        return value & mask, pos
+
+    return read
+
+
+def _zigzag(buf: memoryview, pos: int) -> Tuple[int, int]:
+    value, pos = _read_varint(buf, pos)
+    return wire_format.ZigZagDecode(value), pos
+
+
+def _bool(buf: memoryview, pos: int) -> Tuple[bool, int]:
+    value, pos = _read_varint(buf, pos)
+    return bool(value), pos
+
+
+def _fixed(fmt: str) -> Callable[[memoryview, int], Tuple[Any, int]]:
+    unpack, size = struct.Struct(fmt).unpack_from, struct.calcsize(fmt)
+
+    def read(buf: memoryview, pos: int) -> Tuple[Any, int]:
+        if pos + size > len(buf):
+            raise DecodeError("Truncated message.")
+        return unpack(buf, pos)[0], pos + size
+
+    return read
+
+
+def _bytes(buf: memoryview, pos: int) -> Tuple[bytes, int]:
+    size, pos = _read_varint(buf, pos)
+    if pos + size > len(buf):
+        raise DecodeError("Truncated string.")
+    return buf[pos : pos + size].tobytes(), pos + size
+
+
+def _string(buf: memoryview, pos: int) -> Tuple[str, int]:
+    value, pos = _bytes(buf, pos)
+    try:
+        return value.decode("UTF-8"), pos
+    except UnicodeDecodeError as e:
+        raise DecodeError(f"Error parsing string: {e}") from e
+
+
+_READERS: Dict[int, Callable[[memoryview, int], Tuple[Any, int]]] = {
+    F.TYPE_INT32: _signed_varint(32),
+    F.TYPE_ENUM: _signed_varint(32),
+    F.TYPE_INT64: _signed_varint(64),
+    F.TYPE_UINT32: _unsigned_varint(32),
+    F.TYPE_UINT64: _unsigned_varint(64),
+    F.TYPE_SINT32: _zigzag,
+    F.TYPE_SINT64: _zigzag,
+    F.TYPE_BOOL: _bool,
+    F.TYPE_FIXED32: _fixed("<I"),
+    F.TYPE_FIXED64: _fixed("<Q"),
+    F.TYPE_SFIXED32: _fixed("<i"),
+    F.TYPE_SFIXED64: _fixed("<q"),
+    F.TYPE_FLOAT: _fixed("<f"),
+    F.TYPE_DOUBLE: _fixed("<d"),
+    F.TYPE_STRING: _string,
+    F.TYPE_BYTES: _bytes,
+}
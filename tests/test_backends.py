@@ -0,0 +1,113 @@
+from unittest import TestCase
+
+from protobuf2arr import backends
+from protobuf2arr.serializer import (
+    deserialize_arr2msg,
+    deserialize_arr2msg_bytes,
+    serialize_msg2arr,
+    serialize_msg2arr_bytes,
+)
+from test_basic_pb2 import TestQueue as TestQueueBasic
+
+
+class TestBackends(TestCase):
+    def setUp(self):
+        self.queue = TestQueueBasic(
+            field_int=-7,
+            field_double=0.1,
+            field_string="queue",
+            field_bytes=b"raw",
+            repeated_int=[1, 2, 3],
+        )
+        self.queue.items.add(item_field_double=2.5, item_field_bool=True)
+        self.queue.items.add()
+        self.default = backends.get_backend()
+
+    def tearDown(self):
+        backends.set_backend(self.default)
+
+    def test_output_matches_across_backends(self):
+        expected = serialize_msg2arr(self.queue, backend="simplejson")
+        for name in backends.BACKENDS:
+            serial = serialize_msg2arr(self.queue, backend=name)
+            self.assertEqual(serial, expected, name)
+            self.assertEqual(
+                serialize_msg2arr_bytes(self.queue, backend=name),
+                expected.encode("UTF-8"),
+                name,
+            )
+
+    def test_spellings_match_simplejson(self):
+        queue = TestQueueBasic(
+            field_string="héllo ✓ \U0001d11e \x7f \x00",
+            field_bytes="bÿtes".encode("UTF-8"),
+        )
+        queue.items.add(item_field_string="plain", item_field_double=1e16)
+        cases = [queue]
+        for value in (1e16, 1.5e-7, 3.8e-05, 0.0001, 1e300, -0.0, 123.25):
+            cases.append(TestQueueBasic(field_double=value))
+
+        self.assertIs(backends.get_backend(), backends.BACKENDS["simplejson"])
+        for queue in cases:
+            expected = serialize_msg2arr(queue, backend="simplejson")
+            self.assertTrue(expected.isascii())
+            for name in backends.BACKENDS:
+                serial = serialize_msg2arr(queue, backend=name)
+                self.assertEqual(serial, expected, name)
+                self.assertEqual(
+                    serialize_msg2arr_bytes(queue, backend=name),
+                    expected.encode("UTF-8"),
+                    name,
+                )
+
+    def test_nan_follows_simplejson(self):
+        allow_nan = backends.ALLOW_NAN
+        self.addCleanup(setattr, backends, "ALLOW_NAN", allow_nan)
+        queues = [
+            TestQueueBasic(field_double=value)
+            for value in (float("nan"), float("inf"), float("-inf"))
+        ]
+        # simplejson 3.17 writes NaN/Infinity, 3.19 on rejects them
+        backends.ALLOW_NAN = True
+        for queue in queues:
+            expected = serialize_msg2arr(queue, backend="simplejson")
+            self.assertRegex(expected, r"^\[null,-?(Infinity|NaN),")
+            for name in backends.BACKENDS:
+                self.assertEqual(serialize_msg2arr(queue, backend=name), expected)
+                self.assertEqual(
+                    serialize_msg2arr_bytes(queue, backend=name),
+                    expected.encode("UTF-8"),
+                )
+        backends.ALLOW_NAN = False
+        for queue in queues:
+            for name in backends.BACKENDS:
+                with self.assertRaises(ValueError):
+                    serialize_msg2arr(queue, backend=name)
+                with self.assertRaises(ValueError):
+                    serialize_msg2arr_bytes(queue, backend=name)
+
+    def test_roundtrip_bytes(self):
+        for name in backends.BACKENDS:
+            data = serialize_msg2arr_bytes(self.queue, backend=name)
+            deserial = deserialize_arr2msg_bytes(data, TestQueueBasic(), backend=name)
+            self.assertEqual(
+                deserial, deserialize_arr2msg(data.decode(), TestQueueBasic())
+            )
+            self.assertEqual(deserial.field_bytes, b"raw")
+            self.assertEqual(deserial.items[0].item_field_double, 2.5)
+
+    def test_float_values_roundtrip(self):
+        for value in (1e16, 1e-7, 1.7976931348623157e308, -0.0):
+            queue = TestQueueBasic(field_double=value)
+            for name in backends.BACKENDS:
+                serial = serialize_msg2arr(queue, backend=name)
+                deserial = deserialize_arr2msg(serial, TestQueueBasic(), backend=name)
+                self.assertEqual(deserial.field_double, value, name)
+
+    def test_select_backend(self):
+        backend = backends.get_backend("json")
+        self.assertIs(backends.get_backend(backend), backend)
+        backends.set_backend("json")
+        self.assertIs(backends.get_backend(), backend)
+        with self.assertRaises(ValueError):
+            backends.get_backend("ujson")
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from protobuf2arr.batch import deserialize_many, serialize_many
+from protobuf2arr.serializer import deserialize_arr2msg, serialize_msg2arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+from test_nested_pb2 import TestTree
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.messages = []
+        for i in range(20):
+            queue = TestQueueBasic(field_int=i, field_string=f"queue:{i}")
+            queue.items.add(item_field_int=i)
+            self.messages.append(queue)
+        self.strings = [serialize_msg2arr(msg) for msg in self.messages]
+        self.decoded = [
+            deserialize_arr2msg(arr_str, TestQueueBasic()) for arr_str in self.strings
+        ]
+
+    def test_serialize_many_keeps_order(self):
+        for executor in ("thread", "process"):
+            result = serialize_many(
+                self.messages, workers=2, executor=executor, batch_size=3
+            )
+            self.assertEqual(result, self.strings)
+
+    def test_serialize_many_mixed_types(self):
+        tree = TestTree(value=3, label="root")
+        tree.children.add(label="leaf")
+        messages = [self.messages[0], tree, self.messages[1], TestTree()]
+        expected = [serialize_msg2arr(msg) for msg in messages]
+        for executor in ("thread", "process"):
+            result = serialize_many(messages, workers=2, executor=executor)
+            self.assertEqual(result, expected)
+
+    def test_deserialize_many_keeps_order(self):
+        for executor in ("thread", "process"):
+            result = deserialize_many(
+                self.strings,
+                TestQueueBasic,
+                workers=2,
+                executor=executor,
+                batch_size=3,
+            )
+            self.assertEqual(result, self.decoded)
+
+    def test_inline_and_executor_instance(self):
+        self.assertEqual(serialize_many(self.messages, workers=1), self.strings)
+        with ThreadPoolExecutor(2) as pool:
+            result = deserialize_many(self.strings, TestQueueBasic, executor=pool)
+        self.assertEqual(result, self.decoded)
+        self.assertEqual(serialize_many([]), [])
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            serialize_many(self.messages, executor="fiber")
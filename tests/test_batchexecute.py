@@ -0,0 +1,90 @@
+from unittest import TestCase
+from urllib.parse import parse_qs
+
+import simplejson as json
+
+from protobuf2arr.batchexecute import (
+    RpcResult,
+    build_batchexecute_body,
+    build_batchexecute_request,
+    frame_batchexecute_response,
+    iter_batchexecute,
+    iter_batchexecute_messages,
+)
+from protobuf2arr.serializer import serialize_msg2arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+
+
+RESPONSE = (
+    ")]}'\n\n"
+    "104\n"
+    '[["wrb.fr","Rpc1","[100,null,\\"Hello\\",null,null,null,null,[],null]",'
+    'null,null,null,"generic"],["di",45],["af.httprm",44,"-1",7]]\n'
+    "25\n"
+    '[["e",4,null,null,140]]\n'
+)
+
+
+class TestBatchExecute(TestCase):
+    def test_parse_response(self):
+        results = list(iter_batchexecute([RESPONSE]))
+        self.assertEqual(
+            results,
+            [
+                RpcResult(
+                    "Rpc1",
+                    '[100,null,"Hello",null,null,null,null,[],null]',
+                    "generic",
+                )
+            ],
+        )
+
+        ((result, message),) = iter_batchexecute_messages(
+            [RESPONSE], {"Rpc1": TestQueueBasic}
+        )
+        self.assertEqual(message.field_int, 100)
+        self.assertEqual(message.field_string, "Hello")
+
+    def test_results_stream_before_response_ends(self):
+        first = TestQueueBasic(field_int=1)
+        second = TestQueueBasic(field_int=2)
+        body = frame_batchexecute_response(
+            [
+                RpcResult("Rpc1", serialize_msg2arr(first), "1"),
+                RpcResult("Rpc2", serialize_msg2arr(second), "2"),
+            ]
+        )
+        consumed = []
+
+        def chunks():
+            for i in range(0, len(body), 8):
+                consumed.append(i)
+                yield body[i : i + 8]
+
+        results = iter_batchexecute_messages(
+            chunks(), {"Rpc1": TestQueueBasic, "Rpc2": TestQueueBasic}
+        )
+        result, message = next(results)
+        self.assertEqual((result.rpc_id, result.index), ("Rpc1", "1"))
+        self.assertEqual(message.field_int, 1)
+        self.assertLess(consumed[-1] + 8, len(body))
+
+        result, message = next(results)
+        self.assertEqual((result.rpc_id, result.index), ("Rpc2", "2"))
+        self.assertEqual(message.field_int, 2)
+        self.assertEqual(list(results), [])
+
+    def test_build_request(self):
+        queue = TestQueueBasic(field_int=7)
+        request = build_batchexecute_request([("Rpc1", queue)])
+        self.assertEqual(
+            json.loads(request),
+            [[["Rpc1", serialize_msg2arr(queue), None, "generic"]]],
+        )
+
+        body = parse_qs(build_batchexecute_body([("Rpc1", queue)], at="token"))
+        self.assertEqual(body["f.req"], [request])
+        self.assertEqual(body["at"], ["token"])
+
+        request = build_batchexecute_request([("Rpc1", queue), ("Rpc2", queue)])
+        self.assertEqual([row[3] for row in json.loads(request)[0]], ["1", "2"])
@@ -0,0 +1,142 @@
+from unittest import TestCase
+from google.protobuf import descriptor_pb2
+
+from protobuf2arr import codegen
+from protobuf2arr.bundle import compile_bundle, load_bundle
+from protobuf2arr.lazy import LazyArrView
+from protobuf2arr.patch import patch_arr
+from protobuf2arr.plan import BUNDLED, GENERATED, clear_plans, nullable_values
+from protobuf2arr.serializer import (
+    arr_to_msg,
+    deserialize_arr2msg,
+    msg_to_arr,
+    serialize_msg2arr,
+)
+from protobuf2arr.wire import arr_to_binary, binary_to_arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+from test_nested_pb2 import TestTree
+
+F = descriptor_pb2.FieldDescriptorProto
+
+
+class TestBundle(TestCase):
+    def tearDown(self):
+        BUNDLED.clear()
+        GENERATED.clear()
+        clear_plans()
+
+    def test_compile(self):
+        bundle = load_bundle(compile_bundle(TestTree), install=False)
+        self.assertEqual(
+            bundle.messages["test_nested.TestTree"],
+            [
+                [1, "value", F.TYPE_INT32, F.LABEL_OPTIONAL, ["0"], None],
+                [
+                    2,
+                    "children",
+                    F.TYPE_MESSAGE,
+                    F.LABEL_REPEATED,
+                    [],
+                    "test_nested.TestTree",
+                ],
+                [
+                    3,
+                    "left",
+                    F.TYPE_MESSAGE,
+                    F.LABEL_OPTIONAL,
+                    [""],
+                    "test_nested.TestTree",
+                ],
+                [5, "label", F.TYPE_STRING, F.LABEL_OPTIONAL, [], None],
+            ],
+        )
+        # dependencies are bundled too
+        self.assertEqual(
+            bundle.messages["test_default.TestQueue.TestItem"][0],
+            [1, "item_field_int", F.TYPE_INT32, F.LABEL_OPTIONAL, ["0"], None],
+        )
+        self.assertIs(bundle.message_class("test_nested.TestTree"), TestTree)
+        self.assertEqual(BUNDLED, {})
+
+    def test_install(self):
+        queue = TestQueueBasic(field_int=0, field_string="queue")
+        expected = serialize_msg2arr(queue)
+
+        bundle = load_bundle(compile_bundle(TestQueueBasic))
+        self.assertEqual(serialize_msg2arr(queue), expected)
+        field = TestQueueBasic.DESCRIPTOR.fields_by_name["field_int"]
+        self.assertIs(
+            nullable_values(field),
+            BUNDLED["test_default.TestQueue"]["field_int"].nullable,
+        )
+
+        # plans are rebuilt from the installed bundle
+        bundle.messages["test_default.TestQueue"][0][4] = ["5"]
+        bundle.install()
+        self.assertEqual(serialize_msg2arr(queue), expected.replace("null", "0", 1))
+
+        # entries for other field numbers are ignored
+        bundle.messages["test_default.TestQueue"][0][0] = 99
+        bundle.install()
+        self.assertEqual(serialize_msg2arr(queue), expected)
+
+    def test_install_rebuilds_every_plan(self):
+        cls = TestQueueBasic
+        queue = cls(field_int=5, field_string="queue")
+        queue.items.add(item_field_int=1)
+        data = queue.SerializeToString()
+        # built with the compiled-in nullable values first
+        self.assertEqual(binary_to_arr(data, cls.DESCRIPTOR)[0], 5)
+        self.assertEqual(LazyArrView([None], cls).field_int, 0)
+        self.assertEqual(patch_arr([], cls, {"field_int": 5}), [5])
+        codegen.install(cls)
+
+        bundle = load_bundle(compile_bundle(cls))
+        self.assertIn(cls.DESCRIPTOR, GENERATED)
+        # generated code inlines the old nullable values
+        bundle.messages["test_default.TestQueue"][0][4] = ["5"]
+        bundle.install()
+        self.assertNotIn(cls.DESCRIPTOR, GENERATED)
+        arr = msg_to_arr(queue)
+        self.assertIsNone(arr[0])
+        self.assertEqual(binary_to_arr(data, cls.DESCRIPTOR), arr)
+        msg = arr_to_msg(arr, cls())
+        self.assertEqual(msg.field_int, 5)
+        self.assertEqual(arr_to_binary(arr, cls.DESCRIPTOR), msg.SerializeToString())
+        self.assertEqual(LazyArrView(arr, cls).field_int, 5)
+        self.assertEqual(patch_arr([], cls, {"field_int": 5}), [None])
+
+    def test_unregistered_messages(self):
+        file_proto = descriptor_pb2.FileDescriptorProto(
+            name="protobuf2arr_bundle_test.proto",
+            package="protobuf2arr_bundle_test",
+            dependency=["google/protobuf/descriptor.proto"],
+            syntax="proto3",
+        )
+        file_proto.extension.add(
+            name="nullable",
+            number=50998,
+            type=F.TYPE_STRING,
+            label=F.LABEL_OPTIONAL,
+            extendee=".google.protobuf.FieldOptions",
+        )
+        message = file_proto.message_type.add(name="Item")
+        field = message.field.add(
+            name="count", number=2, type=F.TYPE_INT64, label=F.LABEL_OPTIONAL
+        )
+        field.options.ParseFromString(b"\xb2\xf3\x18\x010")  # (nullable) = '0'
+        file_set = descriptor_pb2.FileDescriptorSet()
+        file_set.file.add().CopyFrom(
+            descriptor_pb2.FileDescriptorProto.FromString(
+                descriptor_pb2.DESCRIPTOR.serialized_pb
+            )
+        )
+        file_set.file.add().CopyFrom(file_proto)
+
+        bundle = load_bundle(compile_bundle(file_set.SerializeToString()))
+        self.assertEqual(bundle.messages["protobuf2arr_bundle_test.Item"][0][4], ["0"])
+        cls = bundle.message_class("protobuf2arr_bundle_test.Item")
+        self.assertIs(bundle.message_class("protobuf2arr_bundle_test.Item"), cls)
+        self.assertEqual(serialize_msg2arr(cls(count=0)), "[null,null]")
+        self.assertEqual(serialize_msg2arr(cls(count=7)), "[null,7]")
+        self.assertEqual(deserialize_arr2msg("[null,null]", cls()), cls())
@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stderr
+from unittest import TestCase
+from google.protobuf.internal import encoder
+
+from protobuf2arr.cli import convert_file, load_message_cls, main
+from protobuf2arr.serializer import arr_to_msg, msg_to_arr, serialize_msg2arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+
+
+class TestCli(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.messages = []
+        for idx in range(50):
+            queue = TestQueueBasic(field_int=idx, field_string=f"queue-{idx}")
+            queue.items.add(item_field_int=idx, item_field_bytes=b"raw")
+            queue.items.add()
+            self.messages.append(queue)
+        self.messages.append(TestQueueBasic())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def _convert(self, source, target, data, **kwargs):
+        with open(self._path(source), "wb") as fp:
+            fp.write(data)
+        out = io.BytesIO()
+        records, size = convert_file(
+            "test_basic_pb2:TestQueue",
+            self._path(source),
+            out,
+            source,
+            target,
+            **kwargs,
+        )
+        self.assertEqual(records, len(self.messages))
+        self.assertEqual(size, len(out.getvalue()))
+        return out.getvalue()
+
+    def _binary(self, messages):
+        return b"".join(
+            encoder._VarintBytes(msg.ByteSize()) + msg.SerializeToString()
+            for msg in messages
+        )
+
+    def test_convert(self):
+        binary = self._binary(self.messages)
+        arr = "".join(serialize_msg2arr(msg) + "\n" for msg in self.messages)
+        # the array format turns empty nullable values into their defaults
+        decoded = self._binary(
+            [arr_to_msg(msg_to_arr(msg), TestQueueBasic()) for msg in self.messages]
+        )
+
+        for workers, chunk_size in ((1, 1 << 20), (2, 64)):
+            kwargs = {"workers": workers, "chunk_size": chunk_size}
+            self.assertEqual(
+                self._convert("binary", "arr", binary, **kwargs), arr.encode()
+            )
+            json_lines = self._convert("arr", "json", arr.encode(), **kwargs)
+            self.assertEqual(json_lines.count(b"\n"), len(self.messages))
+            self.assertEqual(
+                self._convert("json", "binary", json_lines, **kwargs), decoded
+            )
+            self.assertEqual(
+                self._convert("arr", "binary", arr.encode(), **kwargs), decoded
+            )
+
+    def test_main(self):
+        with open(self._path("empty"), "wb"):
+            pass
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            args = ["test_basic_pb2:TestQueue.TestItem", self._path("empty")]
+            main(args + [self._path("out"), "--from", "arr", "--to", "json"])
+        self.assertTrue(stderr.getvalue().startswith("0 records"))
+        self.assertEqual(os.path.getsize(self._path("out")), 0)
+
+        self.assertIs(load_message_cls("test_basic_pb2:TestQueue"), TestQueueBasic)
+        with self.assertRaises(ValueError):
+            load_message_cls("test_basic_pb2")
+        with self.assertRaises(ValueError):
+            convert_file("test_basic_pb2:TestQueue", "", io.BytesIO(), "arr", "xml")
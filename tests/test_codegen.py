@@ -0,0 +1,131 @@
+import os
+import re
+import sys
+import tempfile
+from unittest import TestCase
+
+import test_basic_pb2
+from protobuf2arr import codegen
+from protobuf2arr.plan import (
+    GENERATED,
+    _import_generated,
+    decode_plan,
+    encode_plan,
+    install_generated,
+)
+from protobuf2arr.serializer import arr_to_msg, msg_to_arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+from test_alternate_default_pb2 import TestQueueAlt
+from test_nested_pb2 import TestTree
+
+
+class TestCodegen(TestCase):
+    def setUp(self):
+        _import_generated.cache_clear()
+
+    def tearDown(self):
+        GENERATED.clear()
+        install_generated({})
+        _import_generated.cache_clear()
+
+    def _queues(self):
+        basic = TestQueueBasic(field_int=5, field_bytes=b"bytes")
+        basic.repeated_int.extend([1, 2])
+        basic.items.add(item_field_int=3, item_field_string="inner")
+        basic.items.add()
+        alt = TestQueueAlt(field_int=1, field_string="x")
+        alt.items.add(item_field_int=1)
+        alt.items.add(item_field_int=2, item_field_bool=True)
+        return [TestQueueBasic(), basic, TestQueueAlt(), alt]
+
+    def test_install_matches_generic(self):
+        queues = self._queues()
+        expected = [msg_to_arr(queue) for queue in queues]
+        decoded = [arr_to_msg(arr, type(q)()) for q, arr in zip(queues, expected)]
+
+        codegen.install(TestQueueBasic, TestQueueAlt)
+        self.assertIn(TestQueueBasic.TestItem.DESCRIPTOR, GENERATED)
+        self.assertIs(
+            encode_plan(TestQueueBasic.DESCRIPTOR).encode,
+            GENERATED[TestQueueBasic.DESCRIPTOR][0],
+        )
+        self.assertEqual([msg_to_arr(queue) for queue in queues], expected)
+        self.assertEqual(
+            [arr_to_msg(arr, type(q)()) for q, arr in zip(queues, expected)],
+            decoded,
+        )
+
+        with self.assertRaises(KeyError):
+            arr_to_msg([None] * 9 + [1], TestQueueBasic())
+
+    def test_generated_module_is_discovered(self):
+        queue = self._queues()[1]
+        expected = msg_to_arr(queue)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = codegen.write_module(
+                test_basic_pb2, os.path.join(tmp, "test_basic_arr.py")
+            )
+            with open(path) as fp:
+                self.assertTrue(fp.read().startswith(codegen.HEADER))
+
+            sys.path.insert(0, tmp)
+            try:
+                install_generated({})
+                self.assertEqual(msg_to_arr(queue), expected)
+            finally:
+                sys.path.remove(tmp)
+                sys.modules.pop("test_basic_arr", None)
+        self.assertIn(TestQueueBasic.DESCRIPTOR, GENERATED)
+        self.assertIs(
+            decode_plan(TestQueueBasic.DESCRIPTOR).decode,
+            GENERATED[TestQueueBasic.DESCRIPTOR][1],
+        )
+
+    def test_stale_module_is_ignored(self):
+        queue = self._queues()[1]
+        expected = msg_to_arr(queue)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test_basic_arr.py")
+            codegen.write_module(test_basic_pb2, path)
+            with open(path) as fp:
+                source = fp.read()
+            # as if generated before the schema changed
+            source = re.sub(r"_SCHEMA = '\w+'", "_SCHEMA = '0'", source)
+            with open(path, "w") as fp:
+                fp.write(source)
+
+            sys.path.insert(0, tmp)
+            try:
+                install_generated({})
+                with self.assertLogs(level="WARNING"):
+                    self.assertEqual(msg_to_arr(queue), expected)
+            finally:
+                sys.path.remove(tmp)
+                sys.modules.pop("test_basic_arr", None)
+        self.assertNotIn(TestQueueBasic.DESCRIPTOR, GENERATED)
+
+    def test_sparse_and_deep_messages(self):
+        depth = sys.getrecursionlimit() * 2
+        tree = TestTree(value=1)
+        node = tree
+        for i in range(depth):
+            node = node.left if i % 2 else node.children.add()
+            node.value = i + 2
+        arr = msg_to_arr(tree)
+
+        codegen.install(TestTree)
+        # only the gap before label is checked, one call for the whole range
+        source = codegen.generate_source([TestTree.DESCRIPTOR])
+        self.assertEqual(source.count("_padding("), 2)
+        self.assertEqual(msg_to_arr(TestTree(label="x")), [None, [], None, None, "x"])
+        with self.assertRaises(KeyError):
+            arr_to_msg([None, [], None, 1], TestTree())
+        with self.assertRaises(KeyError):
+            arr_to_msg([None, [], None, None, "", 1], TestTree())
+
+        # generated functions hand deep sub-trees to the iterative plans
+        self.assertEqual(arr_to_msg(msg_to_arr(tree), TestTree()).value, 1)
+        node = arr_to_msg(arr, TestTree())
+        for i in range(depth):
+            node = node.left if i % 2 else node.children[0]
+            self.assertEqual(node.value, i + 2)
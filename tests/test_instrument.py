@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from protobuf2arr import instrument
+from protobuf2arr.serializer import (
+    arr_to_msg,
+    deserialize_arr2msg,
+    msg_to_arr,
+    serialize_msg2arr,
+)
+from test_basic_pb2 import TestQueue as TestQueueBasic
+
+
+class TestInstrument(TestCase):
+    def setUp(self):
+        self.queue = TestQueueBasic(field_int=3, field_string="queue")
+        self.queue.items.add(item_field_int=1)
+        self.queue.items.add()
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.STATS.reset()
+
+    def test_disabled(self):
+        self.assertFalse(instrument.enabled)
+        serialize_msg2arr(self.queue)
+        self.assertEqual(instrument.STATS.messages, {})
+
+    def test_profile(self):
+        name = TestQueueBasic.DESCRIPTOR.full_name
+        with instrument.profile() as stats:
+            self.assertTrue(instrument.enabled)
+            arr_str = serialize_msg2arr(self.queue)
+            deserialize_arr2msg(arr_str, TestQueueBasic())
+        self.assertFalse(instrument.enabled)
+        serialize_msg2arr(self.queue)
+
+        serialize = stats.messages[("serialize_msg2arr", name)]
+        self.assertEqual(serialize.calls, 1)
+        self.assertEqual(serialize.size, len(arr_str))
+        self.assertEqual(serialize.histogram, {1 << len(arr_str).bit_length(): 1})
+        self.assertGreater(serialize.seconds, 0)
+        self.assertEqual(stats.messages[("deserialize_arr2msg", name)].calls, 1)
+        self.assertEqual(stats.messages[("arr_to_msg", name)].calls, 1)
+
+        # 6 null fields and the empty item in the queue, 5 in the first item
+        encode = stats.messages[("msg_to_arr", name)]
+        self.assertEqual(encode.nullable, 12)
+        self.assertEqual(stats.fields[f"{name}.items"], 1)
+        self.assertEqual(stats.fields[f"{name}.TestItem.item_field_string"], 1)
+        self.assertNotIn(f"{name}.field_int", stats.fields)
+        self.assertIn("serialize_msg2arr", stats.report())
+
+    def test_hooks(self):
+        events = []
+        instrument.add_hook(events.append)
+        try:
+            arr_to_msg(msg_to_arr(self.queue), TestQueueBasic())
+        finally:
+            instrument.remove_hook(events.append)
+        self.assertFalse(instrument.enabled)
+        self.assertEqual(
+            [event.operation for event in events], ["msg_to_arr", "arr_to_msg"]
+        )
+        self.assertIsNone(events[0].size)
+
+        instrument.enable()
+        msg_to_arr(self.queue, compact=True)
+        stats = instrument.STATS.messages
+        self.assertEqual(
+            list(stats), [("msg_to_arr", TestQueueBasic.DESCRIPTOR.full_name)]
+        )
@@ -0,0 +1,77 @@
+from google.protobuf.message import Message
+from unittest import TestCase
+
+from protobuf2arr.lazy import LazyArrView
+from protobuf2arr.serializer import arr_to_msg, msg_to_arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+from test_alternate_default_pb2 import TestQueueAlt
+from test_nested_pb2 import TestTree
+
+
+class TestLazyArrView(TestCase):
+    def _assert_view(self, view: LazyArrView, msg: Message) -> None:
+        for field in msg.DESCRIPTOR.fields:
+            value, expected = getattr(view, field.name), getattr(msg, field.name)
+            if field.type != field.TYPE_MESSAGE:
+                if field.label == field.LABEL_REPEATED:
+                    expected = list(expected)
+                self.assertEqual(value, expected, field.name)
+            elif field.label == field.LABEL_REPEATED:
+                self.assertEqual(len(value), len(expected), field.name)
+                for sub_view, sub_msg in zip(value, expected):
+                    self._assert_view(sub_view, sub_msg)
+            elif msg.HasField(field.name):
+                self._assert_view(value, expected)
+            else:
+                self.assertEqual(value.materialize(), expected)
+
+    def _test_view(self, arr, message_cls, compact=False) -> LazyArrView:
+        msg = arr_to_msg(arr, message_cls(), compact=compact)
+        view = LazyArrView(arr, message_cls, compact)
+        self._assert_view(view, msg)
+        self.assertEqual(view.materialize(), msg)
+        return view
+
+    def test_defaults(self):
+        arr = [None] * 9
+        arr[7] = [None, [None] * 6]
+        self._test_view(arr, TestQueueBasic)
+        self._test_view([], TestQueueBasic)
+        self._test_view([None] * 6 + [[None, [None] * 6]], TestQueueAlt)
+        self._test_view([None, None, None, None, None], TestTree)
+
+    def test_values(self):
+        queue = TestQueueBasic(
+            field_int=3,
+            field_double=1.5,
+            field_string="queue",
+            field_bytes=b"raw",
+            field_enum=2,
+            repeated_int=[4, 5],
+        )
+        queue.items.add(item_field_string="item")
+        queue.field_item.item_field_bool = True
+        view = self._test_view(msg_to_arr(queue), TestQueueBasic)
+        self.assertEqual(view.field_bytes, b"raw")
+        self.assertEqual(view.items[0].item_field_string, "item")
+
+        alt = TestQueueAlt(field_int=2)
+        alt.items.add(item_field_int=2)
+        self._test_view(msg_to_arr(alt), TestQueueAlt)
+        self._test_view(msg_to_arr(alt, pivot=1), TestQueueAlt, compact=True)
+
+    def test_nested(self):
+        tree = TestTree(label="root")
+        tree.left.left.value = 3
+        tree.children.add(label="leaf")
+        self._test_view(msg_to_arr(tree), TestTree)
+        self._test_view(msg_to_arr(tree, pivot=2), TestTree, compact=True)
+
+    def test_lazy_conversion(self):
+        view = LazyArrView([1, [[1, [], None, 7]], None, None, "x"], TestTree)
+        self.assertEqual(view.label, "x")
+        self.assertIs(view.children, view.children)
+        with self.assertRaises(AttributeError):
+            view.missing
+        with self.assertRaises(KeyError):
+            view.materialize()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: test_nested.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+import test_basic_pb2 as test__basic__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(
+    b"\n\x11test_nested.proto\x12\x0btest_nested\x1a\x10test_basic.proto\"\x83\x01\n\x08TestTree\x12\x14\n\x05value\x18\x01 \x01(\x05\x42\x05\xda\xb6\x18\x01\x30\x12'\n\x08\x63hildren\x18\x02 \x03(\x0b\x32\x15.test_nested.TestTree\x12)\n\x04left\x18\x03 \x01(\x0b\x32\x15.test_nested.TestTreeB\x04\xda\xb6\x18\x00\x12\r\n\x05label\x18\x05 \x01(\tb\x06proto3"
+)
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, "test_nested_pb2", globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+    DESCRIPTOR._options = None
+    _TESTTREE.fields_by_name["value"]._options = None
+    _TESTTREE.fields_by_name["value"]._serialized_options = b"\332\266\030\0010"
+    _TESTTREE.fields_by_name["left"]._options = None
+    _TESTTREE.fields_by_name["left"]._serialized_options = b"\332\266\030\000"
+    _TESTTREE._serialized_start = 53
+    _TESTTREE._serialized_end = 184
+# @@protoc_insertion_point(module_scope)
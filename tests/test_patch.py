@@ -0,0 +1,94 @@
+from unittest import TestCase
+
+from protobuf2arr.patch import patch_arr
+from protobuf2arr.serializer import arr_to_msg, msg_to_arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+from test_nested_pb2 import TestTree
+
+
+class TestPatch(TestCase):
+    def _queue(self):
+        queue = TestQueueBasic(field_int=5, field_string="token")
+        queue.items.add(item_field_int=1, item_field_string="first")
+        queue.items.add()
+        return queue
+
+    def test_patch(self):
+        queue = self._queue()
+        arr = msg_to_arr(queue)
+        items = arr[7]
+        patched = patch_arr(
+            arr,
+            TestQueueBasic,
+            {
+                "field_string": "refreshed",
+                "field_int": 0,
+                "field_double": 1,
+                "repeated_int": [1, 2],
+                "items[0].item_field_string": "renamed",
+                "items[1].item_field_bytes": b"raw",
+                "field_item": TestQueueBasic.TestItem(item_field_bool=True),
+            },
+        )
+        self.assertIs(patched, arr)
+        self.assertIs(arr[7], items)
+
+        queue.field_string = "refreshed"
+        queue.field_int = 0
+        queue.field_double = 1
+        queue.repeated_int.extend([1, 2])
+        queue.items[0].item_field_string = "renamed"
+        queue.items[1].item_field_bytes = b"raw"
+        queue.field_item.item_field_bool = True
+        self.assertEqual(arr, msg_to_arr(queue))
+        self.assertEqual(arr[0], None)
+        self.assertEqual(arr[1], 1.0)
+
+        patch_arr(arr, TestQueueBasic, {"items": [TestQueueBasic.TestItem()]})
+        self.assertEqual(arr[7], [None])
+        patch_arr(arr, TestQueueBasic, {"field_item": None})
+        self.assertEqual(arr[8], None)
+
+    def test_untouched_positions(self):
+        arr = [1, None, "x", None, None, None, None, [[2]], None, "unknown"]
+        patch_arr(arr, TestQueueBasic, {"items[0].item_field_int": 3})
+        self.assertEqual(
+            arr, [1, None, "x", None, None, None, None, [[3]], None, "unknown"]
+        )
+
+        arr = [1]
+        patch_arr(
+            arr, TestQueueBasic, {"field_string": "x", "field_item.item_field_int": 2}
+        )
+        self.assertEqual(arr, [1, None, "x", None, None, None, None, None, [2]])
+
+    def test_null_messages(self):
+        arr = msg_to_arr(TestQueueBasic())
+        self.assertEqual(arr[8], None)
+        patch_arr(arr, TestQueueBasic, {"field_item.item_field_string": "x"})
+        self.assertEqual(arr[8], [None, None, "x", None, None, None])
+        expected = arr_to_msg(msg_to_arr(TestQueueBasic()), TestQueueBasic())
+        expected.field_item.item_field_string = "x"
+        self.assertEqual(arr_to_msg(arr, TestQueueBasic()), expected)
+
+        arr = msg_to_arr(TestTree())
+        patch_arr(arr, TestTree, {"left.label": "x"})
+        self.assertEqual(arr[2], [None, None, [], None, "x"])
+
+    def test_errors(self):
+        arr = msg_to_arr(self._queue())
+        with self.assertRaises(KeyError):
+            patch_arr(arr, TestQueueBasic, {"missing": 1})
+        with self.assertRaises(ValueError):
+            patch_arr(arr, TestQueueBasic, {"items.item_field_int": 1})
+        with self.assertRaises(ValueError):
+            patch_arr(arr, TestQueueBasic, {"field_int[0]": 1})
+        with self.assertRaises(ValueError):
+            patch_arr(arr, TestQueueBasic, {"field_int.value": 1})
+        with self.assertRaises(IndexError):
+            patch_arr(arr, TestQueueBasic, {"items[5].item_field_int": 1})
+        with self.assertRaises(TypeError):
+            patch_arr(arr, TestQueueBasic, {"field_int": "1"})
+        with self.assertRaises(TypeError):
+            patch_arr(arr, TestQueueBasic, {"field_item": TestTree()})
+        self.assertEqual(arr, msg_to_arr(self._queue()))
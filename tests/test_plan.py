@@ -0,0 +1,73 @@
+from unittest import TestCase
+
+from protobuf2arr import precompile
+from protobuf2arr.plan import decode_plan, encode_plan
+from protobuf2arr.serializer import arr_to_msg, msg_to_arr
+from test_alternate_default_pb2 import TestQueueAlt
+from test_basic_pb2 import TestQueue as TestQueueBasic
+
+
+class TestPlan(TestCase):
+    def setUp(self):
+        encode_plan.cache_clear()
+        decode_plan.cache_clear()
+
+    def test_precompile_builds_nested_plans(self):
+        precompile(TestQueueBasic)
+        self.assertEqual(encode_plan.cache_info().currsize, 2)
+        self.assertEqual(decode_plan.cache_info().currsize, 2)
+
+        msg_to_arr(TestQueueBasic())
+        info = encode_plan.cache_info()
+        self.assertEqual(info.currsize, 2)
+        self.assertEqual(info.misses, 2)
+
+    def test_plan_is_shared_across_instances(self):
+        first = TestQueueBasic(field_int=1)
+        second = TestQueueBasic(field_int=2)
+        self.assertEqual(msg_to_arr(first)[0], 1)
+        self.assertEqual(msg_to_arr(second)[0], 2)
+        self.assertIs(encode_plan(first.DESCRIPTOR), encode_plan(second.DESCRIPTOR))
+
+    def test_decode_plan_parses_nullable_defaults(self):
+        plan = decode_plan(TestQueueAlt.DESCRIPTOR)
+        defaults = {field.name: value for field, value in plan.defaults}
+        self.assertEqual(
+            defaults,
+            {
+                "field_int": 1,
+                "field_double": 1.0,
+                "field_string": "null",
+                "field_bool": True,
+                "field_bytes": b"1",
+                "field_enum": 1,
+            },
+        )
+
+    def test_decode_none_subitem_uses_defaults(self):
+        queue = arr_to_msg([None, None, None, None, None, None, [None]], TestQueueAlt())
+        expected = TestQueueAlt.TestItem(
+            item_field_int=2,
+            item_field_double=1.0,
+            item_field_string="null",
+            item_field_bool=True,
+            item_field_bytes=b"1",
+            item_field_enum=1,
+        )
+        self.assertEqual(list(queue.items), [expected])
+
+    def test_decode_unknown_position(self):
+        with self.assertRaises(KeyError):
+            arr_to_msg([None] * 9 + [1], TestQueueBasic())
+        arr_to_msg([None] * 10, TestQueueBasic())
+
+    def test_nullable_message_matches_prototype(self):
+        queue = TestQueueAlt()
+        queue.items.add(item_field_int=1)
+        queue.items.add(item_field_int=1, item_field_string="x")
+        queue.items.add()
+        arr = msg_to_arr(queue)
+        self.assertEqual(
+            arr[6],
+            [None, [1, 0.0, "x", False, b"", 0], [0, 0.0, "", False, b"", 0]],
+        )
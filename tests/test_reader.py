@@ -0,0 +1,63 @@
+import io
+import simplejson as json
+from time import perf_counter
+from unittest import TestCase
+
+from protobuf2arr.reader import ArrReader
+
+
+class TestReader(TestCase):
+    def _read_all(self, reader: ArrReader) -> list:
+        values = []
+        reader.consume("[")
+        while reader.peek() != "]":
+            values.append(reader.value())
+            if reader.peek() == ",":
+                reader.consume(",")
+        reader.consume("]")
+        reader.end()
+        return values
+
+    def test_values_split_across_chunks(self):
+        doc = '[12345, 0.25, "split string", true, null, {"7": [1]}]'
+        for size in range(1, 8):
+            chunks = (doc[i : i + size] for i in range(0, len(doc), size))
+            self.assertEqual(
+                self._read_all(ArrReader(chunks)),
+                [12345, 0.25, "split string", True, None, {"7": [1]}],
+            )
+
+    def test_multibyte_bytes_chunks(self):
+        doc = '["héllo ✓"]'.encode("UTF-8")
+        reader = ArrReader(io.BytesIO(doc), chunk_size=1)
+        self.assertEqual(self._read_all(reader), ["héllo ✓"])
+
+    def test_truncated_multibyte_character(self):
+        doc = '["héllo ✓"]'.encode("UTF-8")
+        for data in (doc + "✓".encode("UTF-8")[:2], doc[:-3]):
+            reader = ArrReader(io.BytesIO(data), chunk_size=1)
+            with self.assertRaises(UnicodeDecodeError):
+                self._read_all(reader)
+
+    def test_long_value_scales_linearly(self):
+        def best_time(size):
+            doc = '["' + "x" * size + '"]'
+            chunks = [doc[i : i + 1024] for i in range(0, len(doc), 1024)]
+            times = []
+            for _ in range(3):
+                start = perf_counter()
+                self.assertEqual(len(self._read_all(ArrReader(chunks))[0]), size)
+                times.append(perf_counter() - start)
+            return min(times)
+
+        # 4x the text in 4x the chunks, quadratic buffering took ~16x as long
+        ratio = best_time(1 << 22) / best_time(1 << 20)
+        self.assertLess(ratio, 10)
+
+    def test_errors(self):
+        with self.assertRaises(json.JSONDecodeError):
+            ArrReader(['"unterminated']).value()
+        with self.assertRaises(json.JSONDecodeError):
+            self._read_all(ArrReader(["[1] 2"]))
+        with self.assertRaises(json.JSONDecodeError):
+            ArrReader(["1"]).consume("[")
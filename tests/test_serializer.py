@@ -1,3 +1,6 @@
+import io
+import sys
+import tracemalloc
 from google.protobuf.message import Message
 from typing import Any, List
 from unittest import TestCase
@@ -6,10 +9,15 @@ from protobuf2arr.serializer import (
     serialize_msg2arr,
     msg_to_arr,
     deserialize_arr2msg,
+    deserialize_arr2msg_from,
     arr_to_msg,
+    iter_serialize_msg2arr,
+    serialize_msg2arr_to,
 )
+from protobuf2arr.subtree import SubtreeCache
 from test_basic_pb2 import TestQueue as TestQueueBasic
 from test_alternate_default_pb2 import TestQueueAlt
+from test_nested_pb2 import TestTree
 
 
 class TestSerializer(TestCase):
@@ -21,6 +29,15 @@ class TestSerializer(TestCase):
 
         deserial = deserialize_arr2msg(serial, message_cls())
         self.assertEqual(queue, deserial)
+
+        chunks = (serial[i : i + 3] for i in range(0, len(serial), 3))
+        streamed = deserialize_arr2msg_from(chunks, message_cls())
+        self.assertEqual(queue, streamed)
+
+        streamed = deserialize_arr2msg_from(
+            io.BytesIO(serial.encode("UTF-8")), message_cls()
+        )
+        self.assertEqual(queue, streamed)
         return deserial
 
     def test_serialization_basic_default_empty(self):
@@ -205,3 +222,166 @@ class TestSerializer(TestCase):
         self.assertEqual(serial, '[100,77.89,"Hello World",false,"bytes",0,[]]')
 
         self._test_deserialization(queue, arr, serial, TestQueueAlt)
+
+    def test_streaming_serialization(self):
+        queue = TestQueueBasic()
+        queue.field_int = 100
+        queue.field_string = "Hello World"
+        queue.field_bytes = b"bytes"
+        queue.repeated_int.extend([24, 37])
+        for i in range(50):
+            queue.items.add(item_field_int=i, item_field_string=f"item:{i}")
+        queue.items.add()
+        serial = serialize_msg2arr(queue)
+
+        chunks = list(iter_serialize_msg2arr(queue, chunk_size=64))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), serial)
+
+        text = io.StringIO()
+        serialize_msg2arr_to(queue, text)
+        self.assertEqual(text.getvalue(), serial)
+
+        binary = io.BytesIO()
+        serialize_msg2arr_to(queue, binary)
+        self.assertEqual(binary.getvalue(), serial.encode("UTF-8"))
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit() * 2
+        tree = TestTree(value=1)
+        node = tree
+        for i in range(depth):
+            node = node.left
+            node.value = i + 2
+        node.children.add(label="leaf")
+
+        arr = msg_to_arr(tree)
+        self.assertEqual(arr[:2], [1, []])
+
+        decoded = arr_to_msg(arr, TestTree())
+        node = decoded
+        for i in range(depth):
+            node = node.left
+            self.assertEqual(node.value, i + 2)
+        self.assertEqual(node.children[0].label, "leaf")
+
+        self.assertEqual(len(msg_to_arr(tree, max_depth=depth + 1)), 5)
+        with self.assertRaises(ValueError):
+            msg_to_arr(tree, max_depth=10)
+        with self.assertRaises(ValueError):
+            arr_to_msg(arr, TestTree(), max_depth=10)
+        arr_to_msg(arr, TestTree(), max_depth=depth + 1)
+
+    def test_deep_nesting_streaming(self):
+        depth = sys.getrecursionlimit() * 2
+        tree = TestTree(value=1)
+        node = tree
+        for i in range(depth):
+            node = node.left if i % 2 else node.children.add()
+            node.value = i + 2
+        node.label = "leaf"
+
+        serial = "".join(iter_serialize_msg2arr(tree, chunk_size=100))
+        self.assertTrue(serial.startswith("[1,[[2,[],[3,[[4,"))
+        cache = SubtreeCache(lambda node: node.value)
+        self.assertEqual("".join(iter_serialize_msg2arr(tree, cache=cache)), serial)
+
+        chunks = [serial[idx : idx + 50] for idx in range(0, len(serial), 50)]
+        decoded = deserialize_arr2msg_from(chunks, TestTree())
+        node = decoded
+        for i in range(depth):
+            node = node.left if i % 2 else node.children[0]
+            self.assertEqual(node.value, i + 2)
+        self.assertEqual(node.label, "leaf")
+
+    def test_streaming_memory_is_flat(self):
+        def peak(count):
+            queue = TestQueueBasic(field_int=5)
+            for idx in range(count):
+                queue.items.add(item_field_int=idx + 1)
+            tracemalloc.start()
+            try:
+                next(iter_serialize_msg2arr(queue, chunk_size=1024))
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        peak(1)  # plans are built outside the measurement
+        # items are walked as they are written, expanding the whole level up
+        # front took ~1.5 MB for the larger queue
+        self.assertLess(peak(20000), peak(1000) + 256 * 1024)
+
+    def test_streaming_max_depth(self):
+        tree = TestTree(value=1)
+        tree.children.add().left.value = 3
+        serial = serialize_msg2arr(tree)
+        arr = msg_to_arr(tree)
+        for max_depth in range(4):
+            if max_depth < 2:
+                with self.assertRaises(ValueError):
+                    arr_to_msg(arr, TestTree(), max_depth=max_depth)
+                with self.assertRaises(ValueError):
+                    deserialize_arr2msg_from([serial], TestTree(), max_depth=max_depth)
+            else:
+                self.assertEqual(
+                    deserialize_arr2msg_from([serial], TestTree(), max_depth=max_depth),
+                    arr_to_msg(arr, TestTree(), max_depth=max_depth),
+                )
+
+    def test_compact_encoding(self):
+        queue = TestQueueBasic(field_int=5, field_string="x")
+        queue.items.add(item_field_int=3)
+        queue.items.add()
+        full = arr_to_msg(msg_to_arr(queue), TestQueueBasic())
+
+        arr = msg_to_arr(queue, compact=True)
+        self.assertEqual(arr, [5, None, "x", None, None, None, None, [[3], None]])
+        self.assertEqual(arr_to_msg(arr, TestQueueBasic(), compact=True), full)
+
+        arr = msg_to_arr(queue, pivot=2)
+        self.assertEqual(arr, [5, {"3": "x", "8": [[3], None]}])
+        self.assertEqual(arr_to_msg(arr, TestQueueBasic(), compact=True), full)
+
+        serial = serialize_msg2arr(queue, compact=True, pivot=2)
+        self.assertEqual(serial, '[5,{"3":"x","8":[[3],null]}]')
+        deserial = deserialize_arr2msg(serial, TestQueueBasic(), compact=True)
+        self.assertEqual(deserial, full)
+
+        tree = TestTree(label="root")
+        tree.left.value = 2
+        tree.children.add(label="leaf")
+        arr = msg_to_arr(tree, pivot=2)
+        self.assertEqual(
+            arr,
+            [None, [[None, [], {"5": "leaf"}]], {"3": [2, [], {"5": ""}], "5": "root"}],
+        )
+        decoded = arr_to_msg(arr, TestTree(), compact=True, max_depth=2)
+        self.assertEqual(decoded, arr_to_msg(msg_to_arr(tree), TestTree()))
+        with self.assertRaises(KeyError):
+            arr_to_msg([None, [], {"4": 1}], TestTree(), compact=True)
+
+    def test_reuse(self):
+        first = TestQueueBasic(field_int=1, field_string="first")
+        first.items.add(item_field_int=1)
+        second = TestQueueBasic(field_int=2)
+        second.items.add()
+        second.items.add(item_field_string="second")
+        expected = arr_to_msg(msg_to_arr(second), TestQueueBasic())
+        self.assertEqual(len(expected.items), 2)
+
+        msg = arr_to_msg(msg_to_arr(first), TestQueueBasic())
+        self.assertEqual(arr_to_msg(msg_to_arr(second), msg, reuse=True), expected)
+
+        serial = serialize_msg2arr(second)
+        deserialize_arr2msg(serialize_msg2arr(first), msg, reuse=True)
+        self.assertEqual(deserialize_arr2msg(serial, msg, reuse=True), expected)
+        deserialize_arr2msg(serialize_msg2arr(first), msg, reuse=True)
+        self.assertEqual(
+            deserialize_arr2msg_from(io.StringIO(serial), msg, reuse=True), expected
+        )
+
+        # without reuse, values merge into the message
+        merged = arr_to_msg(
+            msg_to_arr(second), arr_to_msg(msg_to_arr(first), TestQueueBasic())
+        )
+        self.assertEqual(len(merged.items), 3)
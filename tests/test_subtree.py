@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from protobuf2arr.serializer import (
+    iter_serialize_msg2arr,
+    msg_to_arr,
+    serialize_msg2arr,
+)
+from protobuf2arr.subtree import SubtreeCache, serialized
+from test_basic_pb2 import TestQueue as TestQueueBasic
+from test_nested_pb2 import TestTree
+
+
+class TestSubtreeCache(TestCase):
+    def _queue(self):
+        queue = TestQueueBasic(field_int=5)
+        for idx in range(6):
+            queue.items.add(item_field_int=idx % 2, item_field_string="shared")
+        queue.items.add()
+        return queue
+
+    def test_msg_to_arr(self):
+        queue = self._queue()
+        cache = SubtreeCache(serialized)
+        arr = msg_to_arr(queue, cache=cache)
+        self.assertEqual(arr, msg_to_arr(queue))
+        self.assertEqual(cache.info(), (4, 2, 1024, 2))
+        self.assertIs(arr[7][0], arr[7][2])
+
+        self.assertEqual(
+            serialize_msg2arr(queue, cache=cache), serialize_msg2arr(queue)
+        )
+        self.assertEqual(cache.info().hits, 10)
+
+        cache.clear()
+        self.assertEqual(cache.info(), (0, 0, 1024, 0))
+        with self.assertRaises(ValueError):
+            msg_to_arr(queue, compact=True, cache=cache)
+
+    def test_writer(self):
+        queue = self._queue()
+        cache = SubtreeCache(serialized)
+        serial = "".join(iter_serialize_msg2arr(queue, cache=cache))
+        self.assertEqual(serial, serialize_msg2arr(queue))
+        self.assertEqual(cache.info(), (4, 2, 1024, 2))
+        # arrays and JSON fragments are cached apart
+        msg_to_arr(queue, cache=cache)
+        self.assertEqual(cache.info().currsize, 4)
+
+    def test_limits(self):
+        queue = self._queue()
+        cache = SubtreeCache(serialized, maxsize=1)
+        self.assertEqual(msg_to_arr(queue, cache=cache), msg_to_arr(queue))
+        self.assertEqual(cache.info().currsize, 1)
+        with self.assertRaises(ValueError):
+            SubtreeCache(serialized, maxsize=0)
+
+        cache = SubtreeCache(serialized, messages=[TestTree])
+        msg_to_arr(queue, cache=cache)
+        self.assertEqual(cache.info(), (0, 0, 1024, 0))
+
+        tree = TestTree(label="root")
+        tree.children.add().children.add(label="leaf")
+        tree.children.add().children.add(label="leaf")
+        with self.assertRaises(ValueError):
+            msg_to_arr(tree, max_depth=1, cache=cache)
+        self.assertEqual(cache.info().currsize, 0)
+        self.assertEqual(msg_to_arr(tree, cache=cache), msg_to_arr(tree))
+        self.assertEqual(cache.info().hits, 1)
+
+    def test_fingerprint(self):
+        queue = self._queue()
+        item_cls = type(queue.items[0])
+        calls = []
+
+        def fingerprint(item):
+            calls.append(item)
+            return item.item_field_int
+
+        cache = SubtreeCache(fingerprint, messages=[item_cls])
+        self.assertEqual(msg_to_arr(queue, cache=cache), msg_to_arr(queue))
+        self.assertEqual(cache.info(), (4, 2, 1024, 2))
+        # one key per cached sub-message and encode
+        self.assertEqual(len(calls), 6)
+
+    def test_shared_between_threads(self):
+        tree = TestTree(label="root")
+        tree.children.add(label="inner").children.add(label="leaf")
+        expected = msg_to_arr(tree)
+        results = []
+
+        def fingerprint(node):
+            # encode the tree on another thread while this one is still
+            # filling in the inner node
+            if node.label == "leaf" and not results:
+                results.append(None)
+                with ThreadPoolExecutor(1) as pool:
+                    results.append(pool.submit(encode).result())
+            return serialized(node)
+
+        def encode():
+            return repr(msg_to_arr(tree, cache=cache))
+
+        cache = SubtreeCache(fingerprint)
+        self.assertEqual(msg_to_arr(tree, cache=cache), expected)
+        self.assertEqual(results, [None, repr(expected)])
@@ -0,0 +1,110 @@
+import sys
+from google.protobuf.message import Message
+from unittest import TestCase
+
+from protobuf2arr.serializer import arr_to_msg, msg_to_arr
+from protobuf2arr.wire import arr_to_binary, binary_to_arr
+from test_basic_pb2 import TestQueue as TestQueueBasic
+from test_alternate_default_pb2 import TestQueueAlt
+from test_nested_pb2 import TestTree
+
+
+class TestWire(TestCase):
+    def _test_transcoding(self, msg: Message) -> None:
+        descriptor = msg.DESCRIPTOR
+        arr = msg_to_arr(msg)
+        self.assertEqual(binary_to_arr(msg.SerializeToString(), descriptor), arr)
+
+        expected = arr_to_msg(arr, type(msg)()).SerializeToString()
+        self.assertEqual(arr_to_binary(arr, descriptor), expected)
+
+    def test_defaults(self):
+        for message_cls in (TestQueueBasic, TestQueueAlt, TestTree):
+            self._test_transcoding(message_cls())
+
+        queue = TestQueueBasic()
+        queue.items.add()
+        queue.field_item.SetInParent()
+        self._test_transcoding(queue)
+
+        alt = TestQueueAlt(field_int=1, field_string="null", field_bool=True)
+        alt.items.add(item_field_int=1)
+        alt.items.add(item_field_int=2)
+        self._test_transcoding(alt)
+
+    def test_values(self):
+        queue = TestQueueBasic(
+            field_int=-7,
+            field_double=0.25,
+            field_string="héllo",
+            field_bool=True,
+            field_bytes=b"raw",
+            field_enum=2,
+            repeated_int=[3, -1, 300],
+        )
+        queue.items.add(item_field_int=1, item_field_string="item")
+        queue.items.add()
+        queue.field_item.item_field_bytes = b"sub"
+        self._test_transcoding(queue)
+
+    def test_nested(self):
+        tree = TestTree(value=1, label="root")
+        tree.left.left.value = 3
+        tree.children.add(label="leaf").children.add()
+        self._test_transcoding(tree)
+
+        with self.assertRaises(ValueError):
+            binary_to_arr(tree.SerializeToString(), TestTree.DESCRIPTOR, max_depth=1)
+        with self.assertRaises(ValueError):
+            arr_to_binary(msg_to_arr(tree), TestTree.DESCRIPTOR, max_depth=1)
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit() * 2
+        tree = TestTree(value=1)
+        node = tree
+        for i in range(depth):
+            node = node.left if i % 2 else node.children.add()
+            node.value = i + 2
+        node.label = "leaf"
+
+        data = arr_to_binary(msg_to_arr(tree), TestTree.DESCRIPTOR)
+        arr = binary_to_arr(data, TestTree.DESCRIPTOR)
+        node = arr
+        for i in range(depth):
+            node = node[2] if i % 2 else node[1][0]
+            self.assertEqual(node[0], i + 2)
+        self.assertEqual(node[4], "leaf")
+
+        with self.assertRaises(ValueError):
+            binary_to_arr(data, TestTree.DESCRIPTOR, max_depth=10)
+        with self.assertRaises(ValueError):
+            arr_to_binary(arr, TestTree.DESCRIPTOR, max_depth=10)
+        binary_to_arr(data, TestTree.DESCRIPTOR, max_depth=depth + 1)
+        arr_to_binary(arr, TestTree.DESCRIPTOR, max_depth=depth + 1)
+
+    def test_null_arrays(self):
+        arr = [None, None, None, None, None, None, None, [None, [None] * 6], None]
+        expected = arr_to_msg(arr, TestQueueBasic()).SerializeToString()
+        self.assertEqual(arr_to_binary(arr, TestQueueBasic.DESCRIPTOR), expected)
+
+        arr = [None, [None, []], None, None, None]
+        expected = arr_to_msg(arr, TestTree()).SerializeToString()
+        self.assertEqual(arr_to_binary(arr, TestTree.DESCRIPTOR), expected)
+        with self.assertRaises(KeyError):
+            arr_to_binary([None, [], None, 1], TestTree.DESCRIPTOR)
+
+    def test_wire_format(self):
+        # unpacked repeated values, merged sub-messages and unknown fields
+        first = TestTree(value=1, label="a")
+        first.left.value = 2
+        second = TestTree(label="b")
+        second.left.label = "c"
+        data = first.SerializeToString() + second.SerializeToString()
+        data += b"\x20\x05"  # unknown field 4, varint
+        data += b"\x3a\x01x"  # unknown field 7, length delimited
+        expected = TestTree.FromString(data)
+        self.assertEqual(binary_to_arr(data, TestTree.DESCRIPTOR), msg_to_arr(expected))
+
+        data = b"\x38\x01\x38\x02\x3a\x02\x03\x04"  # repeated_int 1, 2, packed 3, 4
+        arr = binary_to_arr(data, TestQueueBasic.DESCRIPTOR)
+        self.assertEqual(arr[6], [1, 2, 3, 4])